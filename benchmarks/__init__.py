@@ -0,0 +1,5 @@
+"""
+Benchmarks for the Flask-Meld message path.
+
+Run them with ``python -m benchmarks``; see ``python -m benchmarks --help``.
+"""
@@ -0,0 +1,51 @@
+import argparse
+import json
+import platform
+import sys
+
+import flask_meld
+
+from . import load, micro
+from .app import create_app
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks", description="Benchmark the meld message path."
+    )
+    parser.add_argument("--output", help="Write the JSON results to this file")
+    parser.add_argument(
+        "--sizes", default="10,100,1000", help="Component sizes, comma separated"
+    )
+    parser.add_argument("--number", type=int, default=20, help="Calls per timing")
+    parser.add_argument("--sessions", type=int, default=50)
+    parser.add_argument("--messages", type=int, default=20, help="Per session")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--load-size", type=int, default=100, help="List size")
+    parser.add_argument("--skip-load", action="store_true")
+    args = parser.parse_args(argv)
+
+    sizes = [int(size) for size in args.sizes.split(",")]
+    app = create_app()
+
+    results = {
+        "version": flask_meld.__version__,
+        "python": platform.python_version(),
+        "micro": micro.run(app, sizes, args.number),
+    }
+    if not args.skip_load:
+        results["load"] = load.run(
+            app, args.sessions, args.messages, args.load_size, args.concurrency
+        )
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        sys.stdout.write(output + "\n")
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+A throwaway Flask application with components of configurable size.
+"""
+import tempfile
+from pathlib import Path
+
+from flask import Flask
+
+from flask_meld import Meld
+
+COMPONENTS = {
+    "item_list": """
+from flask_meld.component import Component
+
+
+class ItemList(Component):
+    items = []
+    query = ""
+    selected = None
+
+    def add(self):
+        self.items = list(self.items) + [
+            {"id": len(self.items), "name": f"item {len(self.items)}"}
+        ]
+
+    def select(self, index):
+        self.selected = index
+""",
+}
+
+TEMPLATES = {
+    "item_list": """<div>
+    <input meld:model="query" type="text">
+    <button meld:click="add">Add</button>
+    <ul>
+    {% for item in items %}
+        <li meld:key="{{ item.id }}" class="{{ 'selected' if item.id == selected }}">
+            <button meld:click="select({{ item.id }})">{{ item.name }}</button>
+        </li>
+    {% endfor %}
+    </ul>
+</div>
+""",
+}
+
+
+def items(size):
+    return [{"id": i, "name": f"item {i}"} for i in range(size)]
+
+
+def create_app(directory=None, **config):
+    """
+    Create an app with the benchmark components in `directory`, or in a new
+    temporary directory.
+    """
+    directory = Path(directory or tempfile.mkdtemp(prefix="meld-bench-"))
+    (directory / "meld" / "components").mkdir(parents=True, exist_ok=True)
+    (directory / "templates" / "meld").mkdir(parents=True, exist_ok=True)
+    for name, source in COMPONENTS.items():
+        (directory / "meld" / "components" / f"{name}.py").write_text(source)
+        (directory / "templates" / "meld" / f"{name}.html").write_text(TEMPLATES[name])
+
+    app = Flask(str(directory), root_path=str(directory))
+    app.secret_key = "benchmark"
+    app.config.update(config)
+    Meld(app)
+    return app
@@ -0,0 +1,71 @@
+/*
+    Benchmark of the client's event wiring, run in jsdom without a browser.
+
+    For tables of meld:model inputs and meld:click buttons of several sizes it
+    times setting a component up, morphing in a render where every row changed,
+    and dispatching input events. Prints JSON like the Python benchmarks.
+
+        npm install && node events.mjs [sizes]
+*/
+import { createRequire } from "module";
+import { performance } from "perf_hooks";
+import { JSDOM } from "jsdom";
+
+const require = createRequire(import.meta.url);
+const SOURCE = new URL("../../flask_meld/meld_js_src/", import.meta.url);
+
+const dom = new JSDOM("<!DOCTYPE html><body></body>");
+for (const name of ["window", "document", "NodeFilter", "Node", "Event", "KeyboardEvent"]) {
+  globalThis[name] = dom.window[name];
+}
+// The socket is not used, messages stay in the component's action queue
+globalThis.io = () => ({ on() {}, emit() {} });
+
+const morphdom = require(new URL("morphdom-umd.js", SOURCE).pathname);
+const { Component } = await import(new URL("component.js", SOURCE));
+
+function table(size, version) {
+  let rows = "";
+  for (let i = 0; i < size; i++) {
+    rows +=
+      `<tr meld:key="${i}"><td><input meld:model="row_${i}" value="${version}"></td>` +
+      `<td><button meld:click="remove(${i})">x</button></td></tr>`;
+  }
+  return `<div meld:id="bench"><table>${rows}</table></div>`;
+}
+
+function time(func) {
+  const start = performance.now();
+  func();
+  return (performance.now() - start) / 1000;
+}
+
+function run(size) {
+  document.body.innerHTML = table(size, 0);
+  let component;
+  const setup = time(() => {
+    component = new Component({ id: "bench", name: "bench", data: {} });
+  });
+
+  const morph = time(() => {
+    component.root = morphdom(component.root, table(size, 1), {
+      ...component.morphdomHooks(),
+      getNodeKey: (node) => node.getAttribute && node.getAttribute("meld:key"),
+    });
+  });
+
+  const inputs = component.root.querySelectorAll("input");
+  const events = time(() => {
+    inputs.forEach((input) => input.dispatchEvent(new Event("input", { bubbles: true })));
+  });
+
+  return [
+    { benchmark: "js_setup", size, seconds: setup },
+    { benchmark: "js_morph", size, seconds: morph },
+    { benchmark: "js_input_events", size, seconds: events / size },
+  ];
+}
+
+const sizes = (process.argv[2] || "100,1000,5000").split(",").map(Number);
+console.log(JSON.stringify({ micro: sizes.flatMap(run) }, null, 2));
+process.exit(0);
@@ -0,0 +1,73 @@
+"""
+End-to-end load harness: simulated browser sessions sending meld-message
+events through the Flask-SocketIO test client.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from flask_meld.metrics import Histogram
+
+from .app import items
+
+
+def session_messages(session, messages, size):
+    """
+    The messages one session sends: typing into the search box and clicking
+    items, against a list of `size` items.
+    """
+    meld_id = f"session-{session}"
+    data = {"items": items(size), "query": "", "selected": None}
+    for i in range(messages):
+        if i % 2:
+            action = {"type": "callMethod", "payload": {"name": f"select({i % size})"}}
+        else:
+            action = {"type": "syncInput", "payload": {"name": "query", "value": "q" * i}}
+        yield {
+            "id": meld_id,
+            "componentName": "item_list",
+            "actionQueue": [action],
+            "data": data,
+        }
+
+
+def run_session(app, session, messages, size, latencies, lock):
+    client = app.socketio.test_client(app)
+    for message in session_messages(session, messages, size):
+        start = time.perf_counter()
+        client.emit("meld-message", message)
+        received = client.get_received()
+        elapsed = time.perf_counter() - start
+        assert received, "No meld-response received"
+        with lock:
+            latencies.add(elapsed)
+    client.disconnect()
+
+
+def run(app, sessions, messages, size, concurrency):
+    """
+    Run `sessions` sessions of `messages` messages each, `concurrency` of them
+    at a time, and report throughput and latency percentiles.
+    """
+    latencies = Histogram(size=sessions * messages)
+    lock = threading.Lock()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = [
+            pool.submit(run_session, app, session, messages, size, latencies, lock)
+            for session in range(sessions)
+        ]
+        for future in futures:
+            future.result()
+    elapsed = time.perf_counter() - start
+
+    return {
+        "sessions": sessions,
+        "messages_per_session": messages,
+        "size": size,
+        "concurrency": concurrency,
+        "seconds": elapsed,
+        "messages_per_second": latencies.count / elapsed,
+        "latency": latencies.summary(),
+    }
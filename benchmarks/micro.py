@@ -0,0 +1,63 @@
+"""
+Micro-benchmarks of the component internals used for every message.
+"""
+import timeit
+
+from wtforms import Form, StringField
+
+from flask_meld.component import Component, get_component_class
+from flask_meld.message import _parse_call, parse_call_method_name
+
+from .app import items
+
+
+def measure(func, number):
+    """
+    Best time per call, in seconds, over a few repeats of `number` calls.
+    """
+    return min(timeit.repeat(func, number=number, repeat=5)) / number
+
+
+def form_component(size):
+    fields = {f"field_{i}": StringField(f"Field {i}") for i in range(size)}
+    form_class = type("BenchmarkForm", (Form,), fields)
+    return type("FormComponent", (Component,), {"form": form_class()})
+
+
+def run(app, sizes, number):
+    results = []
+
+    def record(name, size, func):
+        results.append(
+            {"benchmark": name, "size": size, "seconds": measure(func, number)}
+        )
+
+    with app.test_request_context():
+        ItemList = get_component_class("item_list")
+        for size in sizes:
+            component = ItemList("bench", items=items(size))
+            record("view", size, lambda: component._view("item_list"))
+            record("attributes", size, component._attributes)
+
+            attrs = {f"attr_{i}": i for i in range(size)}
+            wide = ItemList("bench", **attrs)
+            record("attributes_wide", size, wide._attributes)
+
+            args = ", ".join(str(i) for i in range(size))
+            record(
+                "parse_call_method_name",
+                size,
+                lambda: parse_call_method_name(f"select({args})"),
+            )
+            record(
+                "parse_call_uncached",
+                size,
+                lambda: _parse_call.__wrapped__(f"select({args})"),
+            )
+
+            FormComponent = form_component(size)
+            data = {f"field_{i}": str(i) for i in range(size)}
+            form = FormComponent("bench")
+            record("bind_form", size, lambda: form._bind_form(data))
+
+    return results
@@ -0,0 +1,221 @@
+import functools
+import gzip
+import hashlib
+import re
+from pathlib import Path
+
+from flask import Response, request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+VENDOR_SCRIPTS = ("socket.io.js", "morphdom-umd.js")
+ENTRY_MODULE = "meld.js"
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+IMPORT_RE = re.compile(
+    r"^import\s*\{([^}]*)\}\s*from\s*[\"']\./([\w.-]+)[\"'];?[ \t]*$", re.MULTILINE
+)
+EXPORT_RE = re.compile(
+    r"^export\s+(?:(?:var|let|const|class)\s+([\w$]+)|function\s*\*?\s*([\w$]+))",
+    re.MULTILINE,
+)
+
+# A slash after one of these starts a regular expression, not a division
+REGEX_PRECEDERS = set("(,=:[!&|?{};+-*%<>~^") | {""}
+REGEX_KEYWORDS = ("return", "typeof", "case", "do", "else", "in", "of")
+
+
+def minify(source):
+    """
+    Remove comments and indentation from javascript. Strings, template
+    literals and regular expressions are kept as they are, as are newlines so
+    that semicolon insertion is not affected.
+    """
+    out = []
+    code = []
+    i = 0
+    length = len(source)
+
+    def flush_code():
+        text = "".join(code)
+        text = re.sub(r"[ \t]*\n\s*", "\n", text)
+        out.append(re.sub(r"[ \t]+", " ", text))
+        code.clear()
+
+    def previous_token():
+        text = "".join(code).rstrip() or "".join(out).rstrip()
+        match = re.search(r"([\w$]+|\S)$", text)
+        return match.group(1) if match else ""
+
+    while i < length:
+        char = source[i]
+        pair = source[i : i + 2]
+
+        if pair == "//":
+            end = source.find("\n", i)
+            i = length if end == -1 else end
+        elif pair == "/*":
+            end = source.find("*/", i + 2)
+            end = length if end == -1 else end + 2
+            if source.startswith("/*!", i):
+                flush_code()
+                out.append(source[i:end] + "\n")
+            else:
+                code.append(" ")
+            i = end
+        elif char in "\"'`":
+            end = _skip_quoted(source, i, char)
+            flush_code()
+            out.append(source[i:end])
+            i = end
+        elif char == "/" and (
+            previous_token() in REGEX_PRECEDERS or previous_token() in REGEX_KEYWORDS
+        ):
+            end = _skip_regex(source, i)
+            flush_code()
+            out.append(source[i:end])
+            i = end
+        else:
+            code.append(char)
+            i += 1
+
+    flush_code()
+    return "".join(out).strip() + "\n"
+
+
+def _skip_quoted(source, start, quote):
+    i = start + 1
+    while i < len(source):
+        if source[i] == "\\":
+            i += 2
+            continue
+        if source[i] == quote:
+            return i + 1
+        i += 1
+    return i
+
+
+def _skip_regex(source, start):
+    i = start + 1
+    in_class = False
+    while i < len(source):
+        char = source[i]
+        if char == "\\":
+            i += 2
+            continue
+        if char == "[":
+            in_class = True
+        elif char == "]":
+            in_class = False
+        elif char == "/" and not in_class:
+            i += 1
+            break
+        i += 1
+    while i < len(source) and (source[i].isalnum() or source[i] == "_"):
+        i += 1
+    return i
+
+
+def _module_order(directory, entry):
+    """
+    The modules imported by `entry`, dependencies first.
+    """
+    order = []
+
+    def visit(name, seen):
+        if name in order:
+            return
+        if name in seen:
+            raise ValueError(f"Circular import of {name}")
+        source = (directory / name).read_text()
+        for match in IMPORT_RE.finditer(source):
+            visit(match.group(2), seen | {name})
+        order.append(name)
+
+    visit(entry, frozenset())
+    return order
+
+
+def _module_body(source):
+    """
+    Turn an ES module into the body of a function that returns its exports.
+    """
+    exports = [a or b for a, b in EXPORT_RE.findall(source)]
+    body = IMPORT_RE.sub(
+        lambda match: f'var {{{match.group(1)}}} = modules["{match.group(2)}"];',
+        source,
+    )
+    body = re.sub(r"^export\s+", "", body, flags=re.MULTILINE)
+    names = ", ".join(f"{name}: {name}" for name in exports)
+    return f'"use strict";\n{body}\nreturn {{{names}}};'
+
+
+def build_modules(directory):
+    """
+    Combine the meld modules of `directory` into one minified classic script
+    that sets the `Meld` global.
+    """
+    directory = Path(directory)
+    modules = ["(function () {", "var modules = {};"]
+    for name in _module_order(directory, ENTRY_MODULE):
+        body = _module_body((directory / name).read_text())
+        modules.append(f'modules["{name}"] = (function () {{\n{body}\n}})();')
+    modules.append("})();")
+    return minify("\n".join(modules))
+
+
+def build_bundle(directory):
+    """
+    Concatenate the vendor scripts and the meld modules of `directory` into a
+    single script.
+    """
+    directory = Path(directory)
+    parts = [(directory / name).read_text() for name in VENDOR_SCRIPTS]
+    parts.append(build_modules(directory))
+    return ";\n".join(parts)
+
+
+class Bundle:
+    """
+    The built javascript bundle, with a content hashed file name and
+    precompressed variants.
+    """
+
+    def __init__(self, source):
+        self.content = source.encode("utf-8")
+        self.hash = hashlib.sha256(self.content).hexdigest()[:16]
+        self.filename = f"meld.{self.hash}.js"
+        self.encodings = {"gzip": gzip.compress(self.content, 9, mtime=0)}
+        if brotli is not None:
+            self.encodings["br"] = brotli.compress(self.content)
+
+    @classmethod
+    @functools.lru_cache(maxsize=None)
+    def from_directory(cls, directory):
+        """
+        Build the bundle for `directory`, once per process.
+        """
+        return cls(build_bundle(directory))
+
+    def response(self):
+        """
+        Respond to the current request with the bundle, compressed when the
+        client accepts it.
+        """
+        if request.if_none_match.contains(self.hash):
+            response = Response(status=304)
+        else:
+            response = Response(self.content, mimetype="application/javascript")
+            for encoding in ("br", "gzip"):
+                if encoding in self.encodings and encoding in request.accept_encodings:
+                    response.set_data(self.encodings[encoding])
+                    response.headers["Content-Encoding"] = encoding
+                    break
+
+        response.set_etag(self.hash)
+        response.headers["Cache-Control"] = CACHE_CONTROL
+        response.vary.add("Accept-Encoding")
+        return response
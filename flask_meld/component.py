@@ -1,11 +1,23 @@
+import inspect
 import os
+import re
+import threading
+import typing
 import uuid
+from contextlib import nullcontext
+from contextvars import ContextVar
+from html import escape
 from importlib.util import module_from_spec, spec_from_file_location
 
-import orjson
 from bs4 import BeautifulSoup
 from bs4.formatter import HTMLFormatter
-from flask import render_template, current_app, jsonify
+from flask import render_template, current_app
+
+from .cache import RenderCache
+from .encoder import dumps, fingerprint, loads
+from .metrics import timed
+from .rewriter import RewriteUnsupported, rewrite_component
+from .state import state_key
 
 
 def convert_to_snake_case(s):
@@ -21,7 +33,14 @@ def convert_to_camel_case(s):
 def get_component_class(component_name):
     """
     Get a component class based on a component name.
+
+    Classes are cached in the application's component registry when Meld has
+    been initialized for the current app.
     """
+    registry = getattr(current_app, "meld_registry", None)
+    if registry is not None:
+        return registry.get(component_name)
+
     module_name = convert_to_snake_case(component_name)
     class_name = convert_to_camel_case(module_name)
     module = get_component_module(module_name)
@@ -30,32 +49,35 @@ def get_component_class(component_name):
     return component_class
 
 
+def component_search_paths(app):
+    """
+    Get the directories that are searched for component modules, in order.
+
+    Components live in the meld/components directory or in a custom location
+    using the config with `MELD_COMPONENT_DIR`.
+    """
+    user_specified_dir = app.config.get("MELD_COMPONENT_DIR", None)
+
+    if not user_specified_dir:
+        name = getattr(app, "name", None)
+        return [
+            os.path.join(name, "meld", "components"),
+            os.path.join("meld", "components"),
+        ]
+    return [user_specified_dir, os.path.join(user_specified_dir, "components")]
+
+
 def get_component_module(module_name):
     """
     Get the module from the meld/components directory or from a
     custom location using the config with `MELD_COMPONENT_DIR`.
     """
-    user_specified_dir = current_app.config.get("MELD_COMPONENT_DIR", None)
+    for directory in component_search_paths(current_app):
+        full_path = os.path.join(directory, module_name + ".py")
+        if os.path.isfile(full_path):
+            return load_module_from_path(full_path, module_name)
 
-    if not user_specified_dir:
-        try:
-            name = getattr(current_app, "name", None)
-            full_path = os.path.join(name, "meld", "components", module_name + ".py")
-            module = load_module_from_path(full_path, module_name)
-        except FileNotFoundError:
-            full_path = os.path.join("meld", "components", module_name + ".py")
-            module = load_module_from_path(full_path, module_name)
-        return module
-    else:
-        try:
-            full_path = os.path.join(user_specified_dir, module_name + ".py")
-            module = load_module_from_path(full_path, module_name)
-        except FileNotFoundError:
-            full_path = os.path.join(
-                user_specified_dir, "components", module_name + ".py"
-            )
-            module = load_module_from_path(full_path, module_name)
-        return module
+    raise FileNotFoundError(f"No meld component module named '{module_name}'")
 
 
 def load_module_from_path(full_path, module_name):
@@ -70,15 +92,126 @@ def load_module_from_path(full_path, module_name):
 
 CSRF_TOKEN_ATTR = "csrf_token"
 
+ATTRIBUTE = "attribute"
+METHOD = "method"
+DESCRIPTOR = "descriptor"
+
+# Sets of instance attribute names whose sorted member names are kept per class
+MEMBER_NAMES_CACHE_SIZE = 32
+
+
+def _to_bool(value):
+    if isinstance(value, str):
+        return value.strip().lower() in ("true", "1", "yes", "on")
+    return bool(value)
+
+
+# Conversions for the annotated arguments of component methods
+ARGUMENT_TYPES = {int: int, float: float, str: str, bool: _to_bool}
+
+# Stands in for the component id in cached renders
+CACHE_ID_PLACEHOLDER = f"meld-{uuid.uuid4().hex}"
+
+_render_context = ContextVar("meld_render_context", default=None)
+
+# Guards the creation of the per-class form locks
+_form_locks_lock = threading.Lock()
+
+# Root tags of nested components, as reported by the client
+TAG_NAME_RE = re.compile(r"[a-z][a-z0-9-]*")
+
+
+def current_render():
+    """
+    Get the `RenderContext` of the component whose template is rendering, or
+    `None` outside of component templates.
+    """
+    return _render_context.get()
+
+
+class RenderContext:
+    """
+    Renders the `{% meld %}` tags in the template of the component `meld_id`.
+
+    Child components get an id made of the parent id and their `key` prop, or
+    their position in the template. `children` maps the ids of the children
+    that the client already has to the fingerprint of their props and the tag
+    of their root; children whose props did not change are sent as `meld:ref`
+    references that the client keeps in place.
+    """
+
+    def __init__(self, meld_id, children=None):
+        self.meld_id = meld_id
+        self.children = children or {}
+        self.count = 0
+
+    def render_child(self, component_name, props=None, lazy=False):
+        props = dict(props or {})
+        key = props.pop("key", self.count)
+        self.count += 1
+        child_id = f"{self.meld_id}.{key}"
+        props_id = fingerprint([component_name, props])
+        known = self.children.get(child_id)
+        if (
+            isinstance(known, dict)
+            and known.get("props") == props_id
+            and TAG_NAME_RE.fullmatch(str(known.get("tag")))
+        ):
+            # The reference has the tag of the child's root, so the browser
+            # parses it in the same place and morphdom matches the two
+            tag = known["tag"]
+            return f'<{tag} meld:ref="{escape(child_id)}"></{tag}>'
+
+        # Children keep their own state between renders of the parent. The
+        # render that finds out a cached component has children is thrown away.
+        store = getattr(current_app, "meld_state_store", None)
+        if self.meld_id == CACHE_ID_PLACEHOLDER:
+            store = None
+        data = {}
+        if store is not None:
+            stored = store.get(state_key(component_name, child_id))
+            if stored is not None:
+                data = loads(stored)
+        data.update(props)
+
+        Child = get_component_class(component_name)
+        with Child._meld_lock():
+            child = Child(child_id, **data)
+            if lazy:
+                rendered = child._placeholder(component_name, props=props_id)
+            else:
+                rendered = child.render(component_name, init=True, props=props_id)
+
+        if store is not None:
+            store.set(state_key(component_name, child_id), dumps(child._attributes()))
+        return rendered
+
 
 class Component:
     """
     The meld Component class does most of the heavy lifting to handle data-binding,
     template context variable binding, template rendering and additional hooks.
     """
+    # Send responses to every client subscribed to the component id instead of
+    # only the client that sent the message.
+    broadcast = False
+
+    # Render after every action, even when the action did not change the
+    # component's attributes. Use when the template reads data from elsewhere.
+    always_render = False
+
+    # Cache rendered markup by component name and attributes. Only for
+    # components whose template depends on nothing but their attributes.
+    cache_render = False
+    cache_size = 128
+    cache_ttl = None
+
+    # Number of nested components in the last render of the component
+    _child_count = 0
+
     def __init__(self, id=None, **kwargs):
         if not id:
-            id = uuid.uuid4()
+            id = getattr(type(self), "id", None) or uuid.uuid4()
         self.errors = {}
         self._form = None
         self.__dict__.update(**kwargs)
@@ -90,12 +223,55 @@ class Component:
     def __repr__(self):
         return f"<meld.Component {self.__class__.__name__}>"
 
-    @property
-    def _meld_attrs(self):
+    # Meld variables and functions that are hidden from the view
+    _meld_attrs = (
+        "id",
+        "render",
+        "validate",
+        "updated",
+        "form",
+        "broadcast",
+        "always_render",
+        "cache_render",
+        "cache_size",
+        "cache_ttl",
+    )
+
+    @classmethod
+    def _meld_lock(cls):
         """
-        A list of meld variables and functions that are hidden from the view
+        Held while a component is constructed, runs its actions and renders.
+        Components of a class with a `form` share that form instance, so they
+        take turns; other classes do not lock.
         """
-        return ["id", "render", "validate", "updated", "form"]
+        if not hasattr(cls, "form"):
+            return nullcontext()
+
+        lock = cls.__dict__.get("_meld_form_lock")
+        if lock is None:
+            with _form_locks_lock:
+                lock = cls.__dict__.get("_meld_form_lock")
+                if lock is None:
+                    # Reentrant for forms nested in components of their class
+                    lock = cls._meld_form_lock = threading.RLock()
+        return lock
+
+    @classmethod
+    def _meld_hidden_attrs(cls):
+        """
+        The names in `_meld_attrs`, which subclasses may still define as a
+        property, along with the ones meld itself hides. Computed once per
+        class.
+        """
+        hidden = cls.__dict__.get("_meld_hidden")
+        if hidden is not None:
+            return hidden
+
+        attrs = inspect.getattr_static(cls, "_meld_attrs")
+        if isinstance(attrs, property):
+            attrs = attrs.fget(cls.__new__(cls))
+        cls._meld_hidden = hidden = frozenset(Component._meld_attrs).union(attrs)
+        return hidden
 
     def _bind_form(self, kwargs):
         """
@@ -103,26 +279,35 @@ class Component:
         bind kwargs to field data.
         """
         self._form = getattr(self, "form")
-        for field in self._form:
-            if not field.type == "SubmitField":
-                meld_attribute = {"meld:model": field.name}
-                setattr(self._form[field.name], "render_kw", meld_attribute)
-                self._bind_data_to_form(field, kwargs)
+        for field_name, render_kw in _form_fields(self._form):
+            field = self._form._fields[field_name]
+            if field.render_kw is not render_kw:
+                field.render_kw = render_kw
+            self._bind_data_to_form(field, kwargs)
+
+    def _rebind_form(self):
+        """
+        Bind the attributes that changed since the form was bound, such as
+        after a method call, leaving the other fields as they are.
+        """
+        for field_name, _ in _form_fields(self._form):
+            value = getattr(self, field_name, None)
+            if self._form._fields[field_name].data != value:
+                self._set_field_data(field_name, value)
 
     def _set_token(self, field):
         """
         Gather the CSRF token from the form and apply it to the component.
         """
-        soup = BeautifulSoup(field.__call__(), features="html.parser")
-        token = soup.find(attrs={"name": CSRF_TOKEN_ATTR}).get("value")
-        self.csrf_token = token
+        self.csrf_token = field._value()
 
     def _bind_data_to_form(self, field, kwargs):
         """
         Bind any attributes from kwargs that are form fields to the form.
         """
         if field.name in kwargs:
-            self._set_field_data(field.name, kwargs[field.name])
+            if field.data != kwargs[field.name]:
+                self._set_field_data(field.name, kwargs[field.name])
             if field.name == CSRF_TOKEN_ATTR:
                 self._set_token(field)
         else:
@@ -143,52 +328,110 @@ class Component:
 
         if field:
             validate = field.validate(self._form)
+            fields = (field,)
         else:
             validate = self._form.validate()
+            fields = self._form
 
         if not validate:
-            for field in self._form:
+            for field in fields:
                 if field.errors:
                     self.errors[field.name] = field.errors
         return validate
 
-    def _attributes(self):
+    @classmethod
+    def _meld_members(cls):
         """
-        Get attributes that can be called in the component.
+        Map the public names of the component class to whether they are data
+        attributes, methods or descriptors that have to be resolved on the
+        instance. Computed once per class.
         """
-        attributes = {}
+        members = cls.__dict__.get("_meld_class_members")
+        if members is not None:
+            return members
+
+        members = {}
+        for name in dir(cls):
+            if name.startswith("_") or name in cls._meld_hidden_attrs():
+                continue
+
+            value = inspect.getattr_static(cls, name)
+            if isinstance(value, (staticmethod, classmethod)) or inspect.isfunction(
+                value
+            ):
+                members[name] = METHOD
+            elif hasattr(type(value), "__get__"):
+                members[name] = DESCRIPTOR
+            else:
+                members[name] = METHOD if callable(value) else ATTRIBUTE
+
+        cls._meld_class_members = members
+        cls._meld_member_names = {}
+        return members
+
+    @classmethod
+    def _meld_actions(cls):
+        """
+        Map the methods that clients can call to the conversions for their
+        positional arguments, taken from the `int`, `float`, `str` and `bool`
+        annotations. Computed once per class.
+        """
+        actions = cls.__dict__.get("_meld_action_table")
+        if actions is not None:
+            return actions
 
-        attributes_names = [
-            attr
-            for attr in dir(self)
-            if not callable(getattr(self, attr))
-            and not attr.startswith("_")
-            and attr not in self._meld_attrs
-        ]
-        for name in attributes_names:
-            attributes[name] = getattr(self, name)
+        actions = {}
+        for name, kind in cls._meld_members().items():
+            if kind is METHOD:
+                actions[name] = _argument_converters(cls, name)
 
-        return attributes
+        cls._meld_action_table = actions
+        return actions
 
-    def _functions(self):
+    def _members(self, methods):
         """
-        Get methods that can be called in the component.
+        Yield the public attributes, or the public methods, of the component.
+        Instance attributes, such as the ones from kwargs, are checked on every
+        call; everything defined on the class comes from `_meld_members`.
         """
+        members = self._meld_members()
+        hidden = self._meld_hidden_attrs()
+        instance = {
+            name: value
+            for name, value in self.__dict__.items()
+            if not name.startswith("_") and name not in hidden
+        }
 
-        functions = {}
-
-        function_list = [
-            func
-            for func in dir(self)
-            if callable(getattr(self, func))
-            and not func.startswith("_")
-            and func not in self._meld_attrs
-        ]
+        extra = frozenset(instance.keys() - members.keys())
+        names = self._meld_member_names.get(extra)
+        if names is None:
+            names = tuple(sorted(members.keys() | extra))
+            # Instance names come from client data, so only a few are cached
+            if len(self._meld_member_names) < MEMBER_NAMES_CACHE_SIZE:
+                self._meld_member_names[extra] = names
+
+        for name in names:
+            if name in instance:
+                is_method = callable(instance[name])
+            elif members[name] is DESCRIPTOR:
+                is_method = callable(getattr(self, name))
+            else:
+                is_method = members[name] is METHOD
+
+            if is_method is methods:
+                yield name, getattr(self, name)
 
-        for func in function_list:
-            functions[func] = getattr(self, func)
+    def _attributes(self):
+        """
+        Get attributes that can be called in the component.
+        """
+        return dict(self._members(methods=False))
 
-        return functions
+    def _functions(self):
+        """
+        Get methods that can be called in the component.
+        """
+        return dict(self._members(methods=True))
 
     def __context__(self):
         """
@@ -205,46 +448,140 @@ class Component:
         """
         pass
 
-    def render(self, component_name: str):
-        return self._view(component_name)
+    def render(self, component_name: str, init=False, children=None, props=None):
+        """
+        Render the component. The first render of a component on a page sets
+        `init` to include the data the client needs to set the component up.
+        `children` are the nested components the client already has, see
+        `RenderContext`, and `props` is the fingerprint of the props of a
+        nested component.
+        """
+        has_children = children or type(self).__dict__.get("_meld_has_children")
+        if not self.cache_render or has_children:
+            return self._view(component_name, init=init, children=children, props=props)
+
+        cache = self._render_cache()
+        key = (component_name, init, props, fingerprint(self._attributes()))
+        rendered = cache.get(key)
+        if rendered is None:
+            rendered = self._view(
+                component_name, meld_id=CACHE_ID_PLACEHOLDER, init=init, props=props
+            )
+            if self._child_count:
+                # Children render from their own state, so the markup cannot
+                # be cached by the attributes of the parent
+                type(self)._meld_has_children = True
+                return self._view(component_name, init=init, props=props)
+            cache.set(key, rendered)
+        return rendered.replace(CACHE_ID_PLACEHOLDER, str(self.id))
+
+    @classmethod
+    def _render_cache(cls):
+        """
+        Get the render cache of the component class, created on first use.
+        """
+        cache = cls.__dict__.get("_meld_render_cache")
+        if cache is None:
+            cache = RenderCache(max_size=cls.cache_size, ttl=cls.cache_ttl)
+            cls._meld_render_cache = cache
+        return cache
 
     def _render_template(self, template_name: str, context_variables: dict):
         return render_template(template_name, **context_variables)
 
-    def _view(self, component_name: str):
-        data = self._attributes()
+    def _view(
+        self, component_name: str, meld_id=None, init=False, children=None, props=None
+    ):
+        if meld_id is None:
+            meld_id = str(self.id)
         context = self.__context__()
+        data = context["attributes"]
         context_variables = {}
-        context_variables.update(context["attributes"])
+        context_variables.update(data)
         context_variables.update(context["methods"])
         context_variables.update({"form": self._form})
 
-        rendered_template = self._render_template(
-            f"meld/{component_name}.html", context_variables
+        render_context = RenderContext(meld_id, children)
+        token = _render_context.set(render_context)
+        try:
+            with timed("render_template"):
+                rendered_template = self._render_template(
+                    f"meld/{component_name}.html", context_variables
+                )
+        finally:
+            _render_context.reset(token)
+        self._child_count = render_context.count
+
+        root_attributes = {}
+        if init:
+            root_attributes["data-meld-init"] = self._init_data(
+                component_name, meld_id, data
+            )
+        if props is not None:
+            root_attributes["data-meld-props"] = props
+
+        with timed("rewrite"):
+            try:
+                return rewrite_component(
+                    rendered_template, meld_id, context_variables, root_attributes
+                )
+            except (RewriteUnsupported, AssertionError):
+                return self._soup_view(
+                    rendered_template, meld_id, context_variables, root_attributes
+                )
+
+    def _init_data(self, component_name, meld_id, data, **extra):
+        """
+        The `data-meld-init` attribute value that registers the component with
+        the client, as JSON escaped for a single quoted attribute.
+        """
+        init = {"id": meld_id, "name": component_name, "data": data}
+        if self.broadcast:
+            init["broadcast"] = True
+        if getattr(current_app, "meld_state_store", None) is not None:
+            init["state"] = fingerprint(data)
+        init.update(extra)
+        return dumps(init).replace("&", "&amp;").replace("'", "&#39;")
+
+    def _placeholder(self, component_name: str, props=None):
+        """
+        Stand-in markup for a lazy component. The client asks for the real
+        render once the placeholder is visible.
+        """
+        meld_id = str(self.id)
+        init = self._init_data(component_name, meld_id, self._attributes(), lazy=True)
+        props = "" if props is None else f' data-meld-props="{props}"'
+        return (
+            f'<div meld:id="{escape(meld_id)}" meld:lazy="" '
+            f"data-meld-init='{init}'{props}></div>"
         )
 
+    def _soup_view(
+        self, rendered_template, meld_id, context_variables, root_attributes=None
+    ):
+        """
+        Apply the meld changes to a rendered template using BeautifulSoup. Used
+        for markup that the streaming rewriter does not handle.
+        """
         soup = BeautifulSoup(rendered_template, features="html.parser")
         root_element = Component._get_root_element(soup)
-        root_element["meld:id"] = str(self.id)
+        root_element["meld:id"] = meld_id
+        for name, value in (root_attributes or {}).items():
+            root_element[name] = value
         self._set_values(root_element, context_variables)
 
-        script = soup.new_tag("script", type="module")
-        init = {"id": str(self.id), "name": component_name, "data": jsonify(data).json}
-        init_json = orjson.dumps(init).decode("utf-8")
-
-        meld_import = 'import {Meld} from "/meld_js_src/meld.js";'
-        script.string = f"{meld_import} Meld.componentInit({init_json});"
-        root_element.append(script)
-
-        rendered_template = Component._desoupify(soup)
-
-        return rendered_template
+        return Component._desoupify(soup)
 
     def _set_values(self, soup, context_variables):
         """
         Set the value on model fields
         """
         for element in soup.select("input,select,textarea"):
+            # Nested components set their own values
+            nested = element.find_parent(lambda tag: tag.has_attr("meld:id"))
+            if nested is not None and nested is not soup:
+                continue
+
             model_attrs = [
                 attr for attr in element.attrs.keys() if attr.startswith("meld:model")
             ]
@@ -278,3 +615,43 @@ class UnsortedAttributes(HTMLFormatter):
     def attributes(self, tag):
         for k, v in tag.attrs.items():
             yield k, v
+
+
+def _form_fields(form):
+    """
+    The names of the fields of `form` that are bound to the component, with
+    the `meld:model` render kwargs for each. Computed once per form class.
+    """
+    fields = type(form).__dict__.get("_meld_form_fields")
+    if fields is None:
+        fields = tuple(
+            (field.name, {"meld:model": field.name})
+            for field in form
+            if not field.type == "SubmitField"
+        )
+        type(form)._meld_form_fields = fields
+    return fields
+
+
+def _argument_converters(cls, name):
+    """
+    The conversion of each positional argument of the method `name`, or
+    `None` for arguments that are passed as they are.
+    """
+    method = getattr(cls, name)
+    try:
+        signature = inspect.signature(method)
+        hints = typing.get_type_hints(method)
+    except (TypeError, ValueError, NameError):
+        return ()
+
+    parameters = [
+        parameter
+        for parameter in signature.parameters.values()
+        if parameter.kind
+        in (parameter.POSITIONAL_ONLY, parameter.POSITIONAL_OR_KEYWORD)
+    ]
+    if inspect.isfunction(inspect.getattr_static(cls, name)):
+        # Skip `self`
+        parameters = parameters[1:]
+    return tuple(ARGUMENT_TYPES.get(hints.get(p.name)) for p in parameters)
@@ -0,0 +1,245 @@
+import threading
+from collections import OrderedDict, namedtuple
+from html import escape
+from html.parser import HTMLParser
+
+from .encoder import dumps
+from .rewriter import VOID_ELEMENTS
+
+RAW_TEXT_ELEMENTS = frozenset(["script", "style"])
+KEY_ATTR = "meld:key"
+
+HistoryEntry = namedtuple("HistoryEntry", ["version", "tree"])
+
+
+class Element:
+    __slots__ = ("tag", "attrs", "children")
+
+    def __init__(self, tag, attrs):
+        self.tag = tag
+        self.attrs = attrs
+        self.children = []
+
+    @property
+    def key(self):
+        return self.attrs.get(KEY_ATTR)
+
+    def elements(self):
+        return [child for child in self.children if isinstance(child, Element)]
+
+    def gaps(self):
+        """
+        The text around the child elements: one entry before each element and
+        one after the last.
+        """
+        gaps = [""]
+        for child in self.children:
+            if isinstance(child, Element):
+                gaps.append("")
+            else:
+                gaps[-1] += child
+        return gaps
+
+    def outer_html(self):
+        attrs = "".join(
+            f' {key}="{escape(value, quote=True)}"' for key, value in self.attrs.items()
+        )
+        if self.tag in VOID_ELEMENTS:
+            return f"<{self.tag}{attrs}>"
+        return f"<{self.tag}{attrs}>{self.inner_html()}</{self.tag}>"
+
+    def inner_html(self):
+        raw = self.tag in RAW_TEXT_ELEMENTS
+        return "".join(
+            child.outer_html()
+            if isinstance(child, Element)
+            else (child if raw else escape(child, quote=False))
+            for child in self.children
+        )
+
+
+class TreeBuilder(HTMLParser):
+    """
+    Build a minimal element tree from rendered component markup.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.root = Element(None, {})
+        self._stack = [self.root]
+
+    def handle_starttag(self, tag, attrs):
+        element = Element(tag, {key: value or "" for key, value in attrs})
+        self._stack[-1].children.append(element)
+        if tag not in VOID_ELEMENTS:
+            self._stack.append(element)
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in VOID_ELEMENTS:
+            self._stack.pop()
+
+    def handle_endtag(self, tag):
+        for depth in range(len(self._stack) - 1, 0, -1):
+            if self._stack[depth].tag == tag:
+                del self._stack[depth:]
+                return
+
+    def handle_data(self, data):
+        children = self._stack[-1].children
+        if children and isinstance(children[-1], str):
+            children[-1] += data
+        else:
+            children.append(data)
+
+
+def parse_tree(markup):
+    """
+    Parse rendered component markup and return the component root element.
+    """
+    builder = TreeBuilder()
+    builder.feed(markup)
+    builder.close()
+    elements = builder.root.elements()
+    if not elements:
+        return None
+
+    return elements[0]
+
+
+def diff_trees(old, new):
+    """
+    Get the operations that turn the `old` component tree into `new`, or `None`
+    when the component root itself changed.
+
+    Elements are addressed by their path of element-child indexes from the
+    component root, along with their tag so the client can detect a DOM that no
+    longer matches the server's view of it.
+    """
+    if old is None or new is None or old.tag != new.tag:
+        return None
+
+    ops = []
+    _diff_element(old, new, [], ops)
+    return ops
+
+
+def _diff_element(old, new, path, ops):
+    tag = new.tag
+    for key, value in new.attrs.items():
+        if old.attrs.get(key) != value:
+            ops.append(["attr", path, tag, key, value])
+    for key in old.attrs:
+        if key not in new.attrs:
+            ops.append(["rmattr", path, tag, key])
+
+    old_elements = old.elements()
+    new_elements = new.elements()
+    new_gaps = new.gaps()
+
+    if _is_keyed(old_elements) and _is_keyed(new_elements):
+        _diff_keyed(old, new, old_elements, new_elements, new_gaps, path, ops)
+        return
+
+    if len(old_elements) != len(new_elements) or old.gaps() != new_gaps:
+        if new_elements or old_elements:
+            ops.append(["html", path, tag, new.inner_html()])
+        else:
+            ops.append(["text", path, tag, "".join(new.children)])
+        return
+
+    for index, (old_child, new_child) in enumerate(zip(old_elements, new_elements)):
+        _diff_child(old_child, new_child, path + [index], ops)
+
+
+def _diff_keyed(old, new, old_elements, new_elements, new_gaps, path, ops):
+    old_by_key = {child.key: child for child in old_elements}
+    entries = []
+    for child in new_elements:
+        previous = old_by_key.get(child.key)
+        if previous is not None and previous.tag == child.tag:
+            entries.append(child.key)
+        else:
+            entries.append({"html": child.outer_html()})
+
+    old_keys = [child.key for child in old_elements]
+    if entries != old_keys or old.gaps() != new_gaps:
+        # Lists usually repeat the same text before each child; send it once
+        if len(set(new_gaps[:-1])) <= 1:
+            gaps = [new_gaps[0], new_gaps[-1]]
+        else:
+            gaps = new_gaps
+        ops.append(["order", path, new.tag, entries, gaps])
+
+    for index, (entry, child) in enumerate(zip(entries, new_elements)):
+        if isinstance(entry, str):
+            _diff_element(old_by_key[entry], child, path + [index], ops)
+
+
+def _diff_child(old, new, path, ops):
+    if old.tag != new.tag or old.key != new.key:
+        ops.append(["replace", path, old.tag, new.outer_html()])
+    else:
+        _diff_element(old, new, path, ops)
+
+
+def _is_keyed(elements):
+    keys = [child.key for child in elements]
+    return bool(keys) and None not in keys and len(set(keys)) == len(keys)
+
+
+class DomHistory:
+    """
+    Remember the last tree rendered for each client session and component so
+    re-renders can be sent as patches. Bounded to `max_size` entries, least
+    recently used first.
+    """
+
+    def __init__(self, max_size=1024):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def patch_response(self, sid, message, response):
+        """
+        Record the rendered `dom` of `response` and replace it with a patch
+        against the previous render when the client has a base to apply it to.
+        """
+        key = (sid, response["id"])
+        tree = parse_tree(response["dom"])
+
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            version = previous.version + 1 if previous else 1
+            self._entries[key] = HistoryEntry(version, tree)
+            self._sessions.setdefault(sid, set()).add(response["id"])
+            while len(self._entries) > self.max_size:
+                (old_sid, old_id), _ = self._entries.popitem(last=False)
+                self._sessions.get(old_sid, set()).discard(old_id)
+
+        response["version"] = version
+        if previous is None or message.get("base") is None:
+            return response
+
+        ops = diff_trees(previous.tree, tree)
+        if ops is None or len(dumps(ops)) >= len(response["dom"]):
+            return response
+
+        del response["dom"]
+        response["patch"] = ops
+        response["base"] = previous.version
+        return response
+
+    def forget(self, sid, id):
+        with self._lock:
+            self._entries.pop((sid, id), None)
+            self._sessions.get(sid, set()).discard(id)
+
+    def forget_session(self, sid):
+        with self._lock:
+            for id in self._sessions.pop(sid, ()):
+                self._entries.pop((sid, id), None)
+
+    def __len__(self):
+        return len(self._entries)
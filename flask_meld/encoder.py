@@ -0,0 +1,90 @@
+import decimal
+import hashlib
+import zlib
+
+import orjson
+from flask import current_app, has_app_context
+
+try:
+    from wtforms import Field, Form
+except ImportError:
+    Field = Form = None
+
+OPTIONS = orjson.OPT_NON_STR_KEYS
+DEFLATE = "deflate"
+
+
+def default(obj):
+    """
+    Encode values that orjson does not support natively. A callable set as
+    `MELD_JSON_DEFAULT` is tried first so apps can add their own types.
+    """
+    if has_app_context():
+        app_default = current_app.config.get("MELD_JSON_DEFAULT", None)
+        if app_default is not None:
+            try:
+                return app_default(obj)
+            except TypeError:
+                pass
+
+    if isinstance(obj, decimal.Decimal):
+        return str(obj)
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    if Field is not None and isinstance(obj, (Field, Form)):
+        return obj.data
+    if hasattr(obj, "__html__"):
+        return str(obj.__html__())
+
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps(obj):
+    """
+    Serialize `obj` to a JSON string.
+    """
+    return orjson.dumps(obj, default=default, option=OPTIONS).decode("utf-8")
+
+
+def fingerprint(obj):
+    """
+    Get a stable hash of `obj`, independent of dict ordering.
+    """
+    encoded = orjson.dumps(obj, default=default, option=OPTIONS | orjson.OPT_SORT_KEYS)
+    return hashlib.blake2b(encoded, digest_size=16).hexdigest()
+
+
+def loads(s):
+    return orjson.loads(s)
+
+
+def compress_dom(message, response, threshold):
+    """
+    Deflate the `dom` of `response` when the client accepts it and it is at
+    least `threshold` characters long. Socket.IO sends the bytes as a binary
+    attachment instead of a JSON string.
+    """
+    dom = response.get("dom")
+    if threshold is None or dom is None or len(dom) < threshold:
+        return response
+    if message.get("accept") != DEFLATE:
+        return response
+
+    response["dom"] = zlib.compress(dom.encode("utf-8"))
+    response["encoding"] = DEFLATE
+    return response
+
+
+class MeldJSON:
+    """
+    JSON module given to Socket.IO so meld-response payloads are encoded once,
+    with orjson and the meld `default`.
+    """
+
+    @staticmethod
+    def dumps(obj, *args, **kwargs):
+        return dumps(obj)
+
+    @staticmethod
+    def loads(s, *args, **kwargs):
+        return loads(s)
@@ -0,0 +1,167 @@
+import asyncio
+import inspect
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import gevent.pool
+except ImportError:
+    gevent = None
+
+INLINE = "inline"
+THREADS = "threads"
+GEVENT = "gevent"
+AUTO = "auto"
+
+log = logging.getLogger(__name__)
+
+
+def run_action(func, *args):
+    """
+    Call a component method or hook, running it to completion when it is an
+    `async def` function.
+    """
+    result = func(*args)
+    if inspect.isawaitable(result):
+        result = asyncio.run(_await(result))
+    return result
+
+
+async def _await(awaitable):
+    return await awaitable
+
+
+def pool_mode(mode, socketio):
+    """
+    Resolve the `auto` pool mode to the pool that matches the Socket.IO async
+    mode. Other modes are returned as they are.
+    """
+    if mode != AUTO:
+        return mode
+    async_mode = getattr(socketio, "async_mode", None) or ""
+    if async_mode.startswith("gevent") and gevent is not None:
+        return GEVENT
+    if async_mode == "threading":
+        return THREADS
+    return INLINE
+
+
+class ActionExecutor:
+    """
+    Run component messages outside of the Socket.IO handler.
+
+    Jobs are queued per component id and run one at a time in the order they
+    were submitted, while different components run concurrently on a pool of
+    `max_workers` threads or greenlets. The `inline` mode runs jobs in the
+    handler itself.
+
+    Jobs with a `merge(other)` method are merged with the jobs queued behind
+    them before they run. `merge` returns the merged job and the number of
+    actions it dropped, or `None` when the jobs cannot be merged.
+    """
+
+    def __init__(self, mode=INLINE, max_workers=8, logger=None):
+        if mode == GEVENT and gevent is None:
+            raise RuntimeError("The 'gevent' meld executor requires gevent")
+
+        self.mode = mode
+        self.max_workers = max_workers
+        self.logger = logger or log
+        self._inboxes = {}
+        self._pending = 0
+        self.merged_jobs = 0
+        self.dropped_actions = 0
+        self._lock = threading.Lock()
+
+        self._pool = None
+        if mode == THREADS:
+            self._pool = ThreadPoolExecutor(
+                max_workers=max_workers, thread_name_prefix="meld"
+            )
+        elif mode == GEVENT:
+            self._pool = gevent.pool.Pool(max_workers)
+        elif mode != INLINE:
+            raise ValueError(f"Unknown meld executor mode '{mode}'")
+
+    @classmethod
+    def for_socketio(cls, mode, socketio, **kwargs):
+        """
+        Create an executor, picking the pool that matches the Socket.IO async
+        mode when `mode` is `auto`.
+        """
+        return cls(pool_mode(mode, socketio), **kwargs)
+
+    @property
+    def queue_depth(self):
+        """
+        Number of jobs waiting to run.
+        """
+        return self._pending
+
+    @property
+    def active_components(self):
+        """
+        Number of components with jobs running or waiting.
+        """
+        return len(self._inboxes)
+
+    def stats(self):
+        return {
+            "mode": self.mode,
+            "max_workers": self.max_workers,
+            "queue_depth": self.queue_depth,
+            "active_components": self.active_components,
+            "merged_jobs": self.merged_jobs,
+            "dropped_actions": self.dropped_actions,
+        }
+
+    def submit(self, key, job):
+        """
+        Queue `job` behind the other jobs for the component `key`.
+        """
+        with self._lock:
+            self._pending += 1
+            inbox = self._inboxes.get(key)
+            if inbox is not None:
+                inbox.append(job)
+                return
+            self._inboxes[key] = deque([job])
+
+        if self._pool is None:
+            self._drain(key)
+        elif self.mode == GEVENT:
+            self._pool.spawn(self._drain, key)
+        else:
+            self._pool.submit(self._drain, key)
+
+    def _drain(self, key):
+        while True:
+            with self._lock:
+                inbox = self._inboxes[key]
+                if not inbox:
+                    del self._inboxes[key]
+                    return
+                job = inbox.popleft()
+                self._pending -= 1
+                while inbox and hasattr(job, "merge"):
+                    merged = job.merge(inbox[0])
+                    if merged is None:
+                        break
+                    job, dropped = merged
+                    inbox.popleft()
+                    self._pending -= 1
+                    self.merged_jobs += 1
+                    self.dropped_actions += dropped
+
+            try:
+                job()
+            except Exception:
+                self.logger.exception("Error processing meld message")
+
+    def shutdown(self, wait=True):
+        if self.mode == THREADS:
+            self._pool.shutdown(wait=wait)
+        elif self.mode == GEVENT and wait:
+            self._pool.join()
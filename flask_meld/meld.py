@@ -1,10 +1,30 @@
 import os
+from functools import partial
 from pathlib import Path
 import pkg_resources
-from flask import send_from_directory, _app_ctx_stack, url_for
-from flask_socketio import SocketIO
+from flask import (
+    Response,
+    current_app,
+    jsonify,
+    send_from_directory,
+    _app_ctx_stack,
+    url_for,
+    request,
+    copy_current_request_context,
+)
+from flask_socketio import SocketIO, join_room
 from .tag import MeldTag, MeldScriptsTag
-from .message import process_message
+from .component import get_component_class
+from .bundle import Bundle
+from .diff import DomHistory
+from .encoder import MeldJSON
+from .executor import AUTO, INLINE, ActionExecutor
+from .message import BatchResponse, MessageJob, process_message
+from .metrics import Metrics, message_timer, timed
+from .pubsub import message_queue_options
+from .registry import ComponentRegistry
+from .render import PageRenderer
+from .state import MemoryStateStore, RedisStateStore, StateStore
 
 
 class Meld:
@@ -14,10 +34,32 @@ class Meld:
         if app is not None:
             self.init_app(app, socketio=socketio, **kwargs)
 
+    static_directory = Path(pkg_resources.resource_filename("flask_meld", "meld_js_src"))
+
     def send_static_file(self, filename):
         """Send a static file from the flask-meld js directory."""
-        directory = Path(pkg_resources.resource_filename('flask_meld', 'meld_js_src'))
-        return send_from_directory(directory, filename)
+        bundle = getattr(current_app, "meld_bundle", None)
+        if bundle is not None and filename == bundle.filename:
+            return bundle.response()
+        return send_from_directory(self.static_directory, filename)
+
+    def metrics_json(self):
+        """Phase timings and executor statistics as JSON."""
+        metrics = current_app.meld_metrics.to_dict()
+        metrics["executor"] = current_app.meld_executor.stats()
+        return jsonify(metrics)
+
+    def metrics_prometheus(self):
+        """Phase timings and executor statistics in the Prometheus text format."""
+        gauges = {
+            f"executor_{name}": value
+            for name, value in current_app.meld_executor.stats().items()
+            if isinstance(value, int)
+        }
+        return Response(
+            current_app.meld_metrics.to_prometheus(gauges),
+            mimetype="text/plain; version=0.0.4",
+        )
 
     def init_app(self, app, socketio=None, **kwargs):
         app.jinja_env.add_extension(MeldTag)
@@ -25,6 +67,11 @@ class Meld:
         if socketio:
             app.socketio = socketio
         else:
+            kwargs.setdefault("json", MeldJSON)
+            message_queue = app.config.get("MELD_MESSAGE_QUEUE", None)
+            if message_queue and not {"message_queue", "client_manager"} & set(kwargs):
+                channel = app.config.get("MELD_CHANNEL", "flask-meld")
+                kwargs.update(message_queue_options(message_queue, channel))
             app.socketio = SocketIO(app, **kwargs)
 
         meld_dir = app.config.get("MELD_COMPONENT_DIR", None)
@@ -38,12 +85,168 @@ class Meld:
                 "The Flask-Meld requires the 'SECRET_KEY' config " "variable to be set"
             )
 
+        app.meld_registry = ComponentRegistry(app)
+        if app.config.get("MELD_PRELOAD_COMPONENTS", False):
+            app.meld_registry.preload()
+
+        app.meld_dom_history = None
+        if app.config.get("MELD_DOM_PATCHES", False):
+            app.meld_dom_history = DomHistory(
+                app.config.get("MELD_DOM_PATCH_HISTORY", 1024)
+            )
+
+        app.meld_state_store = None
+        state_store = app.config.get("MELD_STATE_STORE", None)
+        if isinstance(state_store, StateStore):
+            app.meld_state_store = state_store
+        elif isinstance(state_store, str):
+            app.meld_state_store = RedisStateStore.from_url(
+                state_store, ttl=app.config.get("MELD_STATE_TTL", None)
+            )
+        elif state_store:
+            app.meld_state_store = MemoryStateStore(
+                max_size=app.config.get("MELD_STATE_MAX_SIZE", 10000),
+                ttl=app.config.get("MELD_STATE_TTL", None),
+            )
+
+        app.meld_metrics = None
+        if app.config.get("MELD_METRICS", False):
+            app.meld_metrics = Metrics(app.config.get("MELD_METRICS_SAMPLES", 1024))
+            metrics_url = app.config.get("MELD_METRICS_URL", "/meld/metrics")
+            if metrics_url:
+                app.add_url_rule(metrics_url, "meld_metrics", self.metrics_json)
+                app.add_url_rule(
+                    f"{metrics_url}/prometheus",
+                    "meld_metrics_prometheus",
+                    self.metrics_prometheus,
+                )
+
+        app.meld_bundle = None
+        if app.config.get("MELD_BUNDLE", True):
+            app.meld_bundle = Bundle.from_directory(self.static_directory)
+
         @app.route("/meld_js_src/<path:filename>")
         def meld_static_file(filename):
             return self.send_static_file(filename)
 
+        app.meld_executor = ActionExecutor.for_socketio(
+            app.config.get("MELD_EXECUTOR", INLINE),
+            app.socketio,
+            max_workers=app.config.get("MELD_EXECUTOR_WORKERS", 8),
+            logger=app.logger,
+        )
+
+        app.meld_renderer = None
+        parallel_render = app.config.get("MELD_PARALLEL_RENDER", False)
+        if parallel_render:
+            app.meld_renderer = PageRenderer.for_socketio(
+                AUTO if parallel_render is True else parallel_render,
+                app.socketio,
+                max_workers=app.config.get("MELD_RENDER_WORKERS", 8),
+            )
+            app.after_request(app.meld_renderer.after_request)
+
+        def emit_response(result, to):
+            app.socketio.emit("meld-response", result, to=to)
+
+        def is_broadcast(message):
+            try:
+                component_class = get_component_class(message["componentName"])
+            except Exception:
+                # Processing the message answers it with the error
+                return False
+            return getattr(component_class, "broadcast", False)
+
+        def submit_message(message, emit=None):
+            """
+            Queue a message for processing. `emit` receives the result unless
+            the component is broadcast.
+            """
+            if is_broadcast(message):
+                # Subscribers have different DOM versions so send the full dom
+                join_room(message["id"])
+                sid, batched = None, False
+                emit = partial(emit_response, to=message["id"])
+                # Every subscriber gets the response, the sender settles it
+                origin = request.sid
+            else:
+                sid, batched = request.sid, emit is not None
+                emit = emit or partial(emit_response, to=request.sid)
+                origin = None
+
+            @copy_current_request_context
+            def respond(message):
+                with message_timer(message):
+                    try:
+                        result = process_message(message, sid=sid)
+                    except Exception:
+                        # Answer anyway, so batches complete and the client
+                        # settles the message
+                        app.logger.exception("Error processing meld message")
+                        result = {"id": message["id"], "error": "Server error"}
+                        if "seq" in message:
+                            result["seq"] = message["seq"]
+                    if origin is not None:
+                        result["origin"] = origin
+                    with timed("emit"):
+                        emit(result)
+
+            # Jobs only merge with messages from the same client, including
+            # the ones answered to every subscriber
+            job = MessageJob(message, request.sid, respond, mergeable=not batched)
+            app.meld_executor.submit(message["id"], job)
+
         @app.socketio.on("meld-message")
         def meld_message(message):
-            """meldID, action, componentName"""
-            result = process_message(message)
-            app.socketio.emit("meld-response", result)
+            """meldID, action, componentName, or a batch of them"""
+            if "batch" not in message:
+                submit_message(message)
+                return
+
+            batched = []
+            for item in message["batch"]:
+                # Broadcast components still respond to all of their subscribers
+                if is_broadcast(item):
+                    submit_message(item)
+                else:
+                    batched.append(item)
+
+            batch = BatchResponse(len(batched), partial(emit_response, to=request.sid))
+            for index, item in enumerate(batched):
+                submit_message(item, partial(batch.add, index))
+
+        @app.socketio.on("meld-subscribe")
+        def meld_subscribe(message):
+            """
+            Subscribe the client to every response for a broadcast component.
+            """
+            if is_broadcast(message):
+                join_room(message["id"])
+
+        if app.meld_dom_history is not None:
+            on_disconnect(app.socketio, app.meld_dom_history.forget_session)
+
+
+def on_disconnect(socketio, callback):
+    """
+    Call `callback(sid)` when a client disconnects from the default namespace.
+    A disconnect handler registered before is called after it rather than
+    replaced.
+    """
+    if socketio.server is not None:
+        existing = socketio.server.handlers.get("/", {}).get("disconnect")
+    else:
+        existing = None
+        for event, handler, namespace in socketio.handlers:
+            if event == "disconnect" and namespace == "/":
+                existing = handler
+
+    def meld_disconnect(sid, *args):
+        callback(sid)
+        if existing is not None:
+            return existing(sid, *args)
+
+    if socketio.server is not None:
+        socketio.server.on("disconnect", meld_disconnect, namespace="/")
+    else:
+        socketio.handlers.append(("disconnect", meld_disconnect, "/"))
@@ -1,6 +1,13 @@
 import {$, walk, hasValue, isEmpty, sendMessage, print, debounce} from "./utils.js";
 import { Element } from "./element.js";
 
+// The meld elements of every component, by DOM node
+const elements = new WeakMap();
+
+const NON_BUBBLING_EVENTS = new Set([
+  "blur", "focus", "load", "mouseenter", "mouseleave", "scroll",
+]);
+
 export class Component {
   constructor(args) {
     this.id = args.id;
@@ -14,20 +21,24 @@ export class Component {
     }
 
     this.data = args.data;
+    this.broadcast = !!args.broadcast;
+    this.version = null;
+    this.state = args.state;
 
     this.document = args.document || document;
     this.walker = args.walker || walk;
 
     this.root = undefined;
-    this.modelEls = [];
-    this.keyEls = [];
+    this.listenedRoot = undefined;
+    this.listenedTypes = new Set();
 
     this.actionQueue = [];
     this.activeDebouncers = 0
 
-    this.actionEvents = {};
-    this.attachedEventTypes = [];
-    this.attachedModelEvents = [];
+    // Sequence numbers of the last message sent and the last response applied
+    this.seq = 0;
+    this.applied = 0;
+    this.inFlight = new Map();
 
     this.init();
     this.refreshEventListeners();
@@ -57,10 +68,23 @@ checkComponentDefer(element, action){
   }
 }
 
-addModelEventListener(component, el, eventType) {
-  el.addEventListener(eventType, (event) => {
-    const element = new Element(event.target);
+/**
+ * Handle an event from the single listener for its type at the component root.
+ * Sends the value of a `meld:model` target and the actions of the target, or
+ * of its closest meld parent, for the event type.
+ * @param {Event} event
+ */
+handleEvent(event) {
+  const element = this.ownElement(event.target);
+  if (!element) {
+    return;
+  }
 
+  if (
+    element.el === event.target &&
+    hasValue(element.model) &&
+    element.model.eventType === event.type
+  ) {
     const action = {
       type: "syncInput",
       payload: {
@@ -70,58 +94,176 @@ addModelEventListener(component, el, eventType) {
     };
 
     this.checkComponentDefer(element, action);
+  }
+
+  element.actions.forEach((action) => {
+    if (action.eventType !== event.type) {
+      return;
+    }
+
+    if (action.isPrevent) {
+      event.preventDefault();
+    }
+
+    if (action.isStop) {
+      event.stopPropagation();
+    }
+    var method = { type: "callMethod", payload: { name: action.name } };
+
+    if (!action.key || action.key === event.key.toLowerCase()) {
+      this.actionQueue.push(method);
+      this.queueMessage(element.model);
+    }
   });
 }
 
 /**
- * Adds an action event listener to the document for each type of event (e.g. click, keyup, etc).
- * Added at the document level because validation errors would sometimes remove the
- * events when attached directly to the element.
- * @param {Component} component Component that contains the element.
- * @param {string} eventType Event type to listen for.
+ * Get the meld element of `el` or of its closest meld parent within this
+ * component, or `undefined` when there is none or it belongs to a nested
+ * component.
+ * @param {Node} el
  */
-addActionEventListener(component, eventType) {
-  component.document.addEventListener(eventType, (event) => {
-    let targetElement = new Element(event.target);
+ownElement(el) {
+  let element;
 
-    // Make sure that the target element is a meld element.
-    if (targetElement && !targetElement.isMeld) {
-      targetElement = targetElement.getMeldParent();
+  while (el && el !== this.root) {
+    if (el.hasAttribute && el.hasAttribute("meld:id")) {
+      return undefined;
     }
+    element = element || elements.get(el);
+    el = el.parentElement;
+  }
 
-    if (
-      targetElement &&
-      targetElement.isMeld &&
-      targetElement.actions.length > 0
-    ) {
-      component.actionEvents[eventType].forEach((actionEvent) => {
-        const { action } = actionEvent;
-        const { element } = actionEvent;
-
-        if (targetElement.isSame(element)) {
-          if (action.isPrevent) {
-            event.preventDefault();
-          }
+  return el ? element : undefined;
+}
 
-          if (action.isStop) {
-            event.stopPropagation();
-          }
-          var method = { type: "callMethod", payload: { name: action.name } };
+/**
+ * Listen for `eventType` at the component root, once per root.
+ * @param {string} eventType
+ */
+listen(eventType) {
+  if (this.listenedTypes.has(eventType)) {
+    return;
+  }
 
+  this.listenedTypes.add(eventType);
+  // Events that do not bubble are delegated in the capture phase instead
+  this.root.addEventListener(
+    eventType,
+    (event) => this.handleEvent(event),
+    NON_BUBBLING_EVENTS.has(eventType)
+  );
+}
 
-          if (action.key) {
-            if (action.key === event.key.toLowerCase()) {
-              this.actionQueue.push(method);
-              this.queueMessage(element.model);
-            }
-          } else {
-              this.actionQueue.push(method);
-              this.queueMessage(element.model);
-          }
-        }
-      });
+/**
+ * Index a DOM element, or forget it when it no longer has meld attributes.
+ * @param {Node} el
+ */
+addElement(el) {
+  if (el.nodeType !== 1 || el === this.root) {
+    return;
+  }
+
+  const element = new Element(el);
+  if (!element.isMeld) {
+    elements.delete(el);
+    return;
+  }
+
+  elements.set(el, element);
+  if (hasValue(element.model)) {
+    this.listen(element.model.eventType);
+  }
+  element.actions.forEach((action) => this.listen(action.eventType));
+}
+
+/**
+ * Forget a DOM element that was removed from the component.
+ * @param {Node} el
+ */
+removeElement(el) {
+  elements.delete(el);
+}
+
+/**
+ * Morphdom options that keep the element index in step with the changes,
+ * leave the inputs in `pending` as the user left them and keep the nested
+ * components that the server sent as `meld:ref` references.
+ * @param {Map} pending Values of inputs that the render does not know about.
+ */
+morphdomHooks(pending = new Map()) {
+  return {
+    onBeforeElUpdated: (fromEl, toEl) =>
+      !toEl.hasAttribute("meld:ref") && !this.hasPendingInput(fromEl, pending),
+    onNodeAdded: (node) => {
+      this.addElement(node);
+      return node;
+    },
+    onElUpdated: (el) => this.addElement(el),
+    onNodeDiscarded: (node) => this.removeElement(node),
+  };
+}
+
+/**
+ * Check whether `el` is a `meld:model` input with a value in `pending`.
+ * @param {Node} el
+ * @param {Map} pending
+ */
+hasPendingInput(el, pending) {
+  const element = elements.get(el);
+  return !!element && hasValue(element.model) && pending.has(element.model.name);
+}
+
+/**
+ * The props fingerprints and root tags of the components nested directly in
+ * this one, by id, so the server can send the ones that did not change as
+ * references.
+ */
+children() {
+  const children = {};
+  this.root.querySelectorAll("[data-meld-props]").forEach((el) => {
+    if (el.parentElement.closest("[meld\\:id]") === this.root) {
+      children[el.getAttribute("meld:id")] = {
+        props: el.getAttribute("data-meld-props"),
+        tag: el.tagName.toLowerCase(),
+      };
     }
   });
+  return children;
+}
+
+/**
+ * Forget the messages up to `seq` and return their actions.
+ * @param {number} seq
+ */
+settle(seq) {
+  const actions = [];
+  this.inFlight.forEach((actionQueue, sent) => {
+    if (sent <= seq) {
+      actions.push(...actionQueue);
+      this.inFlight.delete(sent);
+    }
+  });
+  return actions;
+}
+
+/**
+ * The input values that are still on their way to the server or waiting to
+ * be sent, by model name.
+ */
+pendingInputs() {
+  const pending = new Map();
+  const collect = (actionQueue) => {
+    actionQueue.forEach((action) => {
+      if (action.type === "syncInput") {
+        pending.set(action.payload.name, action.payload.value);
+      }
+    });
+  };
+
+  this.inFlight.forEach(collect);
+  collect(this.actionQueue);
+  return pending;
 }
 
 queueMessage(model, callback) {
@@ -146,73 +288,17 @@ queueMessage(model, callback) {
     }
   }
 
+  /**
+   * Index every element of the component. Only needed when the root changed
+   * or the DOM was changed without the morphdom hooks.
+   */
   refreshEventListeners() {
-    this.actionEvents = {};
-    this.modelEls = [];
-    this.dbEls = [];
-
-    walk(this.root, (el) => {
-      if (el.isSameNode(this.root)) {
-        // Skip the component root element
-        return;
-      }
-
-      const element = new Element(el);
-
-      if (element.isMeld) {
-        if (
-          hasValue(element.field) &&
-          (hasValue(element.db) || hasValue(element.model))
-        ) {
-          if (!this.attachedDbEvents.some((e) => e.isSame(element))) {
-            this.attachedDbEvents.push(element);
-            addDbEventListener(this, element.el, element.field.eventType);
-          }
-
-          if (!this.dbEls.some((e) => e.isSame(element))) {
-            this.dbEls.push(element);
-          }
-        } else if (
-          hasValue(element.model) &&
-          isEmpty(element.db) &&
-          isEmpty(element.field)
-        ) {
-          if (!this.attachedModelEvents.some((e) => e.isSame(element))) {
-            this.attachedModelEvents.push(element);
-            this.addModelEventListener(this, element.el, element.model.eventType);
-          }
-
-          if (!this.modelEls.some((e) => e.isSame(element))) {
-            this.modelEls.push(element);
-          }
-        } else if (hasValue(element.loading)) {
-          this.loadingEls.push(element);
-
-          // Hide loading elements that are shown when an action happens
-          if (element.loading.show) {
-            element.hide();
-          }
-        }
-
-        if (hasValue(element.key)) {
-          this.keyEls.push(element);
-        }
-
-        element.actions.forEach((action) => {
-          if (this.actionEvents[action.eventType]) {
-            this.actionEvents[action.eventType].push({ action, element });
-          } else {
-            this.actionEvents[action.eventType] = [{ action, element }];
-
-            if (
-              !this.attachedEventTypes.some((et) => et === action.eventType)
-            ) {
-              this.attachedEventTypes.push(action.eventType);
-              this.addActionEventListener(this, action.eventType);
-            }
-          }
-        });
-      }
-    });
+    if (this.listenedRoot !== this.root) {
+      // Listeners on a replaced root are gone with it
+      this.listenedRoot = this.root;
+      this.listenedTypes = new Set();
     }
+
+    this.walker(this.root, (el) => this.addElement(el));
+  }
 }
@@ -39,6 +39,17 @@ export class Element {
 
     return value;
   }
+  /**
+   * The parent element, created when it is first needed.
+   */
+  get parent() {
+    if (this._parent === undefined) {
+      const parentElement = this.el.parentElement;
+      this._parent = parentElement ? new Element(parentElement) : null;
+    }
+    return this._parent;
+  }
+
   /**
    * Get the element's next parent that is a unicorn element.
    *
@@ -61,11 +72,6 @@ export class Element {
     this.id = this.el.id;
     this.isMeld= false;
     this.attributes = [];
-    this.parent = null;
-
-    if (this.el.parentElement) {
-      this.parent = new Element(this.el.parentElement);
-    }
 
     this.model = {};
     this.poll = {};
@@ -1,7 +1,8 @@
 import { Component } from "./component.js";
 import { Element } from "./element.js";
 import { Attribute } from "./attribute.js";
-import { contains, hasValue, isEmpty, sendMessage, socketio, print } from "./utils.js";
+import { contains, hasValue, isEmpty, sendMessage, requestRender, resendWithData, decodeResponse, socketio, print } from "./utils.js";
+import { applyPatch } from "./patch.js";
 
 export var Meld = (function () {
   var meld = {};  // contains all methods exposed publicly in the meld object
@@ -16,47 +17,157 @@ export var Meld = (function () {
   meld.init = function (_messageUrl) {
     messageUrl = _messageUrl;
 
-    socketio.on('meld-response', function(responseJson) {
-      if (!responseJson) {
-        return
+    socketio.on('connect', function() {
+      // Rooms are per connection so resubscribe after a reconnect
+      for (var id in components) {
+        if (components[id].broadcast) {
+          subscribe(components[id]);
+        }
       }
+    });
 
-      if (responseJson.error) {
-        console.error(responseJson.error);
-        return
-      }
-      if (!components[responseJson.id])
-        return
-      else if(components[responseJson.id].actionQueue.length > 0)
-        return
-
-
-      updateData(components[responseJson.id], responseJson.data);
-      var dom = responseJson.dom;
-
-      var morphdomOptions = {
-        childrenOnly: false,
-        getNodeKey: function (node) {
-          // A node's unique identifier. Used to rearrange elements rather than
-          // creating and destroying an element that already exists.
-          if (node.attributes) {
-            var key = node.getAttribute("meld:key") || node.id;
-            if (key) {
-              return key;
-            }
-          }
-        },
-      }
-      var componentRoot = $('[meld\\:id="' + responseJson.id + '"]');
-      morphdom(componentRoot, dom, morphdomOptions);
-      components[responseJson.id].refreshEventListeners()
+    // Responses wait for the ones before them that are still being inflated
+    var received = Promise.resolve();
+    socketio.on('meld-response', function(responseJson) {
+      received = received.then(function () {
+        return decodeResponse(responseJson);
+      }).then(function (responseJson) {
+        if (responseJson && responseJson.batch) {
+          responseJson.batch.forEach(handleResponse);
+        } else {
+          handleResponse(responseJson);
+        }
+      }).catch(function (error) {
+        console.error(error);
+      });
     });
+
+    if (document.readyState === 'loading') {
+      document.addEventListener('DOMContentLoaded', function () {
+        meld.initComponents(document);
+      });
+    } else {
+      meld.initComponents(document);
+    }
   }
 
+/*
+    Set up the components rendered in `scope` from their data-meld-init
+    attribute, which is removed so each component is only set up once.
+    */
+meld.initComponents = function (scope) {
+  scope.querySelectorAll('[data-meld-init]').forEach(function (el) {
+    const args = JSON.parse(el.getAttribute('data-meld-init'));
+    el.removeAttribute('data-meld-init');
+    meld.componentInit(args);
+  });
+};
+
+/*
+    Apply a component's response to its data and DOM.
+    */
+function handleResponse(responseJson) {
+  if (!responseJson) {
+    return
+  }
+
+  var component = components[responseJson.id];
+  var ordered = component && !component.broadcast && responseJson.seq !== undefined;
+  // Broadcast responses go to every subscriber, only the sender settles them
+  var own = ordered || (component && component.broadcast &&
+    responseJson.seq !== undefined && responseJson.origin === socketio.id);
+  var settled = [];
+  if (ordered) {
+    // Responses are applied in the order of their messages. Messages that
+    // were merged on the server are answered by the response to the last one.
+    if (responseJson.seq <= component.applied) {
+      return
+    }
+    component.applied = responseJson.seq;
+  }
+  if (own) {
+    settled = component.settle(responseJson.seq);
+  }
+
+  if (responseJson.error) {
+    console.error(responseJson.error);
+    return
+  }
+  if (!component || responseJson.unchanged)
+    return
+
+  if (responseJson.resync) {
+    resendWithData(component, own ? settled : component.settle(component.seq));
+    return
+  }
+
+  // Inputs the server has not seen yet keep the value the user gave them
+  var pending = component.pendingInputs();
+  updateData(component, responseJson.data);
+  pending.forEach(function (value, name) {
+    component.data[name] = value;
+  });
+  if (responseJson.state !== undefined) {
+    component.state = responseJson.state;
+  }
+
+  var componentRoot = $('[meld\\:id="' + responseJson.id + '"]');
+  // Only the parent of a nested component renders it with its props
+  var props = componentRoot.getAttribute('data-meld-props');
+
+  if (responseJson.patch) {
+    if (component.version !== responseJson.base ||
+        !applyPatch(componentRoot, responseJson.patch,
+                    (el) => component.hasPendingInput(el, pending))) {
+      // The DOM does not match the server's base, ask for the full component
+      component.version = null;
+      requestRender(component);
+      return
+    }
+    component.version = responseJson.version;
+    component.refreshEventListeners()
+    keepProps(component, props);
+    return
+  }
+
+  var dom = responseJson.dom;
+
+  var morphdomOptions = {
+    ...component.morphdomHooks(pending),
+    childrenOnly: false,
+    getNodeKey: function (node) {
+      // A node's unique identifier. Used to rearrange elements rather than
+      // creating and destroying an element that already exists.
+      if (node.attributes) {
+        // References to nested components match the components they stand for
+        var key = node.getAttribute("meld:key") || node.getAttribute("meld:ref") ||
+          node.getAttribute("meld:id") || node.id;
+        if (key) {
+          return key;
+        }
+      }
+    },
+  }
+  // The root is replaced when its tag changes, such as for lazy placeholders
+  component.root = morphdom(componentRoot, dom, morphdomOptions);
+  component.version = responseJson.version;
+  if (component.root !== componentRoot) {
+    component.refreshEventListeners()
+  }
+  keepProps(component, props);
+  // Nested components that were rendered again are set up with their new data
+  meld.initComponents(component.root);
+}
+
+function keepProps(component, props) {
+  if (props !== null && !component.root.hasAttribute('data-meld-props')) {
+    component.root.setAttribute('data-meld-props', props);
+  }
+}
+
 function updateData(component, newData){
-  data = JSON.parse(newData);
-  for (var key in data) {
-    component.data[key] = data[key];
+  for (var key in newData) {
+    component.data[key] = newData[key];
   }
 }
 
@@ -76,9 +187,53 @@ function contains(str, search) {
     Initializes the component.
     */
 meld.componentInit = function (args) {
+  const existing = components[args.id];
+  if (existing && existing.root && existing.root.isConnected) {
+    // A nested component rendered again by its parent
+    existing.data = args.data;
+    existing.state = args.state;
+    existing.version = null;
+    existing.init();
+    existing.refreshEventListeners();
+    return;
+  }
+
   const component = new Component(args);
   components[component.id] = component;
+
+  if (component.broadcast) {
+    subscribe(component);
+  }
+  if (args.lazy) {
+    renderWhenVisible(component);
+  }
 };
+
+/*
+    Ask for the render of a lazy component once its placeholder scrolls into
+    view, or when the browser is idle if visibility cannot be observed.
+    */
+function renderWhenVisible(component) {
+  if ('IntersectionObserver' in window) {
+    const observer = new IntersectionObserver(function (entries) {
+      if (entries.some((entry) => entry.isIntersecting)) {
+        observer.disconnect();
+        requestRender(component);
+      }
+    });
+    observer.observe(component.root);
+  } else {
+    const idle = window.requestIdleCallback || ((callback) => setTimeout(callback, 1));
+    idle(() => requestRender(component));
+  }
+}
+
+/*
+    Receive the responses sent to every subscriber of a broadcast component.
+    */
+function subscribe(component) {
+  socketio.emit('meld-subscribe', {'id': component.id, 'componentName': component.name});
+}
 function toKebabCase(str) {
   if (!str) {
     return "";
@@ -113,17 +268,6 @@ function getCsrfToken() {
   return csrfToken;
 }
 
-/*
-    Traverse the DOM looking for child elements.
-    */
-function walk(el, callback) {
-  var walker = document.createTreeWalker(el, NodeFilter.SHOW_ELEMENT, null, false);
-
-  while (walker.nextNode()) {
-    // TODO: Handle sub-components
-    callback(walker.currentNode);
-  }
-}
 /*
     Get a value from an element. Tries to deal with HTML weirdnesses.
     */
@@ -162,3 +306,6 @@ function $(selector, scope) {
 
 return meld;
 }());
+
+// The page calls Meld.init through the global, which also works with the bundle
+window.Meld = Meld;
@@ -0,0 +1,134 @@
+/*
+    Apply a list of patch operations sent by the server to a component root.
+    Returns false as soon as an operation does not match the DOM, in which case
+    the caller should ask the server for the full component.
+
+    Inputs for which `keep` returns true, such as inputs the user is still
+    typing in, keep their value. Operations that would replace them fail.
+    */
+export function applyPatch(root, ops, keep = () => false) {
+  for (const op of ops) {
+    const el = resolve(root, op[1], op[2]);
+    if (!el) {
+      return false;
+    }
+
+    switch (op[0]) {
+      case "attr":
+        if (!(FORM_PROPERTIES.has(op[3]) && keep(el))) {
+          el.setAttribute(op[3], op[4]);
+          syncProperty(el, op[3], op[4]);
+        }
+        break;
+      case "rmattr":
+        if (!(FORM_PROPERTIES.has(op[3]) && keep(el))) {
+          el.removeAttribute(op[3]);
+          syncProperty(el, op[3], null);
+        }
+        break;
+      case "text":
+        if (!keep(el)) {
+          el.textContent = op[3];
+        }
+        break;
+      case "html":
+        if (keepsDescendant(el, keep)) {
+          return false;
+        }
+        el.innerHTML = op[3];
+        break;
+      case "replace":
+        if (el === root || keep(el) || keepsDescendant(el, keep)) {
+          return false;
+        }
+        el.replaceWith(fragment(op[3]));
+        break;
+      case "order":
+        if (!reorder(el, op[3], op[4])) {
+          return false;
+        }
+        break;
+      default:
+        return false;
+    }
+  }
+  return true;
+}
+
+const FORM_PROPERTIES = new Set(["value", "checked", "selected"]);
+
+function keepsDescendant(el, keep) {
+  return Array.from(el.querySelectorAll("input,select,textarea")).some(keep);
+}
+
+/*
+    Find an element by its path of element-child indexes and check its tag.
+    */
+function resolve(root, path, tag) {
+  let el = root;
+  for (const index of path) {
+    el = el.children[index];
+    if (!el) {
+      return null;
+    }
+  }
+  return el.tagName.toLowerCase() === tag ? el : null;
+}
+
+/*
+    Rebuild the children of a keyed list. Entries are either the `meld:key`
+    of an existing child or the html of a new one.
+    */
+function reorder(el, entries, gaps) {
+  const byKey = {};
+  for (const child of el.children) {
+    const key = child.getAttribute("meld:key");
+    if (key !== null) {
+      byKey[key] = child;
+    }
+  }
+
+  const nodes = [];
+  for (const entry of entries) {
+    const node = typeof entry === "string" ? byKey[entry] : fragment(entry.html);
+    if (!node) {
+      return false;
+    }
+    nodes.push(node);
+  }
+
+  // Two gaps are the text before each child and the text after the last one
+  const gap = (i) =>
+    gaps.length === 2 ? gaps[i < nodes.length ? 0 : 1] : gaps[i];
+  el.textContent = "";
+  nodes.forEach((node, i) => {
+    appendText(el, gap(i));
+    el.appendChild(node);
+  });
+  appendText(el, gap(nodes.length));
+  return true;
+}
+
+function appendText(el, text) {
+  if (text) {
+    el.appendChild(document.createTextNode(text));
+  }
+}
+
+function fragment(html) {
+  const template = document.createElement("template");
+  template.innerHTML = html;
+  return template.content.firstElementChild;
+}
+
+/*
+    Keep form control properties in line with their attributes, the same way
+    morphdom does for full updates.
+    */
+function syncProperty(el, name, value) {
+  if (name === "value" && "value" in el) {
+    el.value = value === null ? "" : value;
+  } else if ((name === "checked" || name === "selected") && name in el) {
+    el[name] = value !== null;
+  }
+}
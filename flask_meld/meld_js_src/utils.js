@@ -1,4 +1,5 @@
-export var socketio = io();
+// Options such as the transports come from MELD_SOCKET_OPTIONS
+export var socketio = io(window.meldSocketOptions);
 /*
     Handles calling the message endpoint and merging the results into the document.
     */
@@ -8,25 +9,114 @@ export function sendMessage(component) {
     return;
   }
 
-  // Prevent network call when the action queue gets repeated
-  if (component.currentActionQueue === component.actionQueue) {
-    return;
+  const actionQueue = component.actionQueue;
+  component.actionQueue = [];
+
+  emitMessage(component, actionQueue, component.version, false);
+}
+
+/*
+    Ask the server to render the whole component without running any action.
+    */
+export function requestRender(component) {
+  emitMessage(component, [], null, false);
+}
+
+/*
+    Send actions again along with the component data, for when the server no
+    longer has the component's state.
+    */
+export function resendWithData(component, actionQueue) {
+  emitMessage(component, actionQueue, component.version, true);
+}
+
+/*
+    Every message has the next sequence number of its component, which the
+    server echoes in the response. The actions are kept until the response
+    for them, or for a later message, has been applied.
+    */
+function emitMessage(component, actionQueue, base, withData) {
+  var seq = ++component.seq;
+  var message = {'id': component.id, 'actionQueue': actionQueue, 'componentName': component.name, 'base': base, 'seq': seq};
+  component.inFlight.set(seq, actionQueue);
+  if (canInflate) {
+    message.accept = 'deflate';
   }
 
-  component.currentActionQueue = component.actionQueue;
-  component.actionQueue = [];
+  // Components with server-side state only send the version of their data
+  if (withData || component.state === undefined) {
+    message.data = component.data;
+  } else {
+    message.state = component.state;
+  }
 
-  socketio.emit('meld-message', {'id': component.id, 'actionQueue': component.currentActionQueue, 'componentName': component.name, 'data': component.data});
+  var children = component.children();
+  if (Object.keys(children).length) {
+    message.children = children;
+  }
+  queueEmit(message);
 }
 
+// Large renders can be sent deflated when the browser can inflate them
+var canInflate = typeof DecompressionStream !== 'undefined';
+
 /*
-Traverse the DOM looking for child elements.
+    Inflate the deflated doms of a response, or of a batch of responses.
+    Returns a promise of the response with every dom as a string.
+    */
+export function decodeResponse(responseJson) {
+  if (responseJson && responseJson.batch) {
+    return Promise.all(responseJson.batch.map(decodeResponse)).then(function (batch) {
+      return {'batch': batch};
+    });
+  }
+  if (!responseJson || responseJson.encoding !== 'deflate') {
+    return Promise.resolve(responseJson);
+  }
+
+  var stream = new Blob([responseJson.dom]).stream().pipeThrough(new DecompressionStream('deflate'));
+  return new Response(stream).text().then(function (dom) {
+    responseJson.dom = dom;
+    delete responseJson.encoding;
+    return responseJson;
+  });
+}
+
+var pendingMessages = [];
+
+/*
+    Messages sent in the same tick, usually by one user interaction, go to
+    the server in one batch.
+    */
+function queueEmit(message) {
+  pendingMessages.push(message);
+  if (pendingMessages.length === 1) {
+    setTimeout(flushMessages, 0);
+  }
+}
+
+function flushMessages() {
+  const messages = pendingMessages;
+  pendingMessages = [];
+
+  if (messages.length === 1) {
+    socketio.emit('meld-message', messages[0]);
+  } else {
+    socketio.emit('meld-message', {'batch': messages});
+  }
+}
+
+/*
+Traverse the DOM looking for child elements. Nested components are skipped,
+they index their own elements.
 */
 export function walk(el, callback) {
-  var walker = document.createTreeWalker(el, NodeFilter.SHOW_ELEMENT, null, false);
+  var filter = function (node) {
+    return node.hasAttribute("meld:id") ? NodeFilter.FILTER_REJECT : NodeFilter.FILTER_ACCEPT;
+  };
+  var walker = document.createTreeWalker(el, NodeFilter.SHOW_ELEMENT, filter, false);
 
   while (walker.nextNode()) {
-    // TODO: Handle sub-components
     callback(walker.currentNode);
   }
 }
@@ -1,75 +1,349 @@
 import ast
+import copy
+import functools
+import re
+import threading
+
+from flask import current_app
 
 from .component import get_component_class
-from flask import jsonify
-import orjson
+from .encoder import compress_dom, dumps, fingerprint, loads
+from .executor import run_action
+from .metrics import component_resolved, message_timer, timed
+from .state import state_key
+
+SYNC_INPUT = "syncInput"
+CALL_METHOD = "callMethod"
+
+ARGUMENT_RE = re.compile(
+    r"""\s*(?:
+        (?P<string>'(?:[^'\\]|\\.)*'|"(?:[^"\\]|\\.)*")
+        |(?P<number>[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)
+        |(?P<word>[^,'"()\[\]{}]*?)
+    )\s*(?:,|\Z)""",
+    re.VERBOSE,
+)
+CONSTANTS = {"True": True, "False": False, "None": None}
+
 
+class InvalidAction(Exception):
+    """
+    An action that the component does not allow.
+    """
 
-def process_message(message):
+
+def process_message(message, sid=None):
+    with message_timer(message):
+        response = _process_message(message, sid)
+    if "seq" in message:
+        # Lets the client apply responses in the order of its messages
+        response["seq"] = message["seq"]
+    return response
+
+
+def _process_message(message, sid):
     meld_id = message["id"]
     component_name = message["componentName"]
     action_queue = message["actionQueue"]
 
-    data = message["data"]
-    Component = get_component_class(component_name)
-    component = Component(meld_id, **data)
+    with timed("load"):
+        Component = get_component_class(component_name)
+    component_resolved()
+    try:
+        actions = _prepare_actions(Component, action_queue)
+    except InvalidAction as e:
+        return {"id": meld_id, "error": str(e)}
 
-    for action in action_queue:
-        payload = action.get("payload", None)
-        if "syncInput" in action["type"]:
-            if hasattr(component, payload["name"]):
-                setattr(component, payload["name"], payload["value"])
-                if component._form:
-                    field_name = payload.get("name")
-                    if field_name in component._form._fields:
-                        field = getattr(component._form, field_name)
-                        component._set_field_data(field_name, payload["value"])
-                        component.updated(field)
-                        component.errors[field_name] = field.errors or ""
-                else:
-                    component.updated(payload["name"])
+    store = getattr(current_app, "meld_state_store", None)
+    key = state_key(component_name, meld_id)
+    previous = None
+    stored = None
+    if store is not None:
+        with timed("store"):
+            stored = store.get(key)
+    if stored is not None:
+        # Client data is only trusted when the server has no state for it
+        data = loads(stored)
+        previous = loads(stored)
+    elif "data" in message:
+        data = message["data"]
+    else:
+        # Ask the client for its data when the server has no state for it
+        return {"id": meld_id, "resync": True}
 
-        elif "callMethod" in action["type"]:
-            call_method_name = payload.get("name", "")
-            method_name, params = parse_call_method_name(call_method_name)
+    # Components with a form share it with the other instances of their class
+    with Component._meld_lock():
+        with timed("construct"):
+            component = Component(meld_id, **data)
+        with timed("encode"):
+            state = fingerprint(component._attributes())
 
-            if method_name is not None and hasattr(component, method_name):
-                func = getattr(component, method_name)
+        with timed("actions"):
+            _run_actions(component, actions)
 
-                if params:
-                    func(*params)
-                else:
-                    func()
-                if component._form:
-                    component._bind_form(component._attributes())
+        attributes = component._attributes()
+        with timed("encode"):
+            new_state = fingerprint(attributes)
+            encoded = None
+            if store is not None and (previous is None or new_state != state):
+                encoded = dumps(attributes)
+        if encoded is not None:
+            with timed("store"):
+                store.set(key, encoded)
 
-    rendered_component = component.render(component_name)
+        if action_queue and not component.always_render and new_state == state:
+            return {"id": meld_id, "unchanged": True}
+
+        rendered_component = component.render(
+            component_name, children=message.get("children")
+        )
 
     res = {
         "id": meld_id,
         "dom": rendered_component,
-        "data": orjson.dumps(jsonify(component._attributes()).json).decode("utf-8"),
+        "data": attributes,
     }
+
+    if store is not None:
+        res["state"] = new_state
+        # A client that had the stored state only needs the keys that changed
+        if (
+            previous is not None
+            and message.get("state") == state
+            and not component.broadcast
+        ):
+            current = loads(encoded) if encoded is not None else previous
+            res["data"] = _changed_data(previous, current)
+
+    dom_history = getattr(current_app, "meld_dom_history", None)
+    if sid is not None and dom_history is not None:
+        if component._child_count:
+            # Nested components change on their own, so the client's tree
+            # cannot be patched from the last render of the parent
+            dom_history.forget(sid, meld_id)
+        else:
+            with timed("patch"):
+                res = dom_history.patch_response(sid, message, res)
+
+    threshold = current_app.config.get("MELD_COMPRESS_THRESHOLD", None)
+    # Broadcast responses also go to clients that did not ask for compression
+    if threshold is not None and not component.broadcast:
+        with timed("compress"):
+            res = compress_dom(message, res, threshold)
     return res
 
 
+def _prepare_actions(Component, action_queue):
+    """
+    Check the actions against the component's dispatch table and parse the
+    method calls, before the component is constructed.
+    """
+    dispatch = Component._meld_actions()
+    actions = []
+    for action in action_queue:
+        action_type = action["type"]
+        payload = action.get("payload") or {}
+
+        if action_type == SYNC_INPUT:
+            name = payload.get("name", "")
+            if (
+                name.startswith("_")
+                or name in Component._meld_hidden_attrs()
+                or name in dispatch
+            ):
+                raise InvalidAction(f"'{name}' cannot be set")
+            actions.append((SYNC_INPUT, name, payload.get("value")))
+
+        elif action_type == CALL_METHOD:
+            method_name, params = _parse_call(payload.get("name", ""))
+            converters = dispatch.get(method_name)
+            if converters is None:
+                raise InvalidAction(f"'{method_name}' is not a component action")
+            args = _convert_arguments(method_name, converters, params)
+            actions.append((CALL_METHOD, method_name, args))
+
+        else:
+            raise InvalidAction(f"Unknown action type '{action_type}'")
+    return actions
+
+
+def _convert_arguments(method_name, converters, params):
+    if not params:
+        return ()
+    if any(isinstance(param, (list, dict, set)) for param in params):
+        # Parsed calls are cached, so do not share their values with the method
+        params = copy.deepcopy(params)
+
+    args = list(params)
+    for index, convert in enumerate(converters[: len(args)]):
+        if convert is not None:
+            try:
+                args[index] = convert(args[index])
+            except (TypeError, ValueError):
+                raise InvalidAction(
+                    f"Invalid argument {args[index]!r} for '{method_name}'"
+                )
+    return args
+
+
+def _run_actions(component, actions):
+    for action_type, name, value in actions:
+        if action_type == SYNC_INPUT:
+            if hasattr(component, name):
+                setattr(component, name, value)
+                if component._form:
+                    if name in component._form._fields:
+                        field = getattr(component._form, name)
+                        component._set_field_data(name, value)
+                        run_action(component.updated, field)
+                        component.errors[name] = field.errors or ""
+                else:
+                    run_action(component.updated, name)
+
+        else:
+            run_action(getattr(component, name), *value)
+            if component._form:
+                component._rebind_form()
+
+
+class MessageJob:
+    """
+    A meld-message waiting for the executor. `respond` processes the message
+    and emits the response.
+
+    Messages from the same client for the same component that are still
+    waiting are merged into one, so the component renders once for all of them.
+    """
+
+    def __init__(self, message, sid, respond, mergeable=True):
+        self.message = message
+        self.sid = sid
+        self.respond = respond
+        self.mergeable = mergeable
+
+    def __call__(self):
+        self.respond(self.message)
+
+    def merge(self, other):
+        if not isinstance(other, MessageJob) or other.sid != self.sid:
+            return None
+        if not (self.mergeable and other.mergeable):
+            return None
+
+        actions = self.message["actionQueue"] + other.message["actionQueue"]
+        action_queue = coalesce_actions(actions)
+
+        # The later message has the most recent data and DOM version
+        message = dict(other.message, actionQueue=action_queue)
+        if "data" in self.message and "data" not in message:
+            message["data"] = self.message["data"]
+        dropped = len(actions) - len(action_queue)
+        return MessageJob(message, self.sid, other.respond), dropped
+
+
+class BatchResponse:
+    """
+    Collect the results of a batch of messages and emit them together, in the
+    order of the batch, once every message has been processed.
+    """
+
+    def __init__(self, size, emit):
+        self.results = [None] * size
+        self.remaining = size
+        self.emit = emit
+        self._lock = threading.Lock()
+
+    def add(self, index, result):
+        with self._lock:
+            self.results[index] = result
+            self.remaining -= 1
+            done = self.remaining == 0
+        if done:
+            self.emit({"batch": self.results})
+
+
+def coalesce_actions(action_queue):
+    """
+    Drop `syncInput` actions that are superseded by a later `syncInput` for
+    the same name before any method is called.
+    """
+    actions = []
+    synced = {}
+    for action in action_queue:
+        if action["type"] != SYNC_INPUT:
+            synced = {}
+            actions.append(action)
+            continue
+
+        name = action["payload"]["name"]
+        if name in synced:
+            actions[synced[name]] = None
+        synced[name] = len(actions)
+        actions.append(action)
+    return [action for action in actions if action is not None]
+
+
+def _changed_data(previous, current):
+    return {
+        key: value
+        for key, value in current.items()
+        if key not in previous or previous[key] != value
+    }
+
+
 def parse_call_method_name(call_method_name: str):
+    method_name, params = _parse_call(call_method_name)
+    return method_name, None if params is None else list(params)
+
+
+@functools.lru_cache(maxsize=1024)
+def _parse_call(call_method_name):
+    """
+    Split a call such as `select(1, 'a')` into the method name and a tuple of
+    its arguments, or `None` when it has no arguments. Cached, since the same
+    calls come from the same templates over and over.
+    """
     params = None
     method_name = call_method_name
 
     if "(" in call_method_name and call_method_name.endswith(")"):
         param_idx = call_method_name.index("(")
-        params_str = call_method_name[param_idx:]
-
-        # Remove the arguments from the method name
-        method_name = call_method_name.replace(params_str, "")
+        method_name = call_method_name[:param_idx]
 
         # Remove parenthesis
-        params_str = params_str[1:-1]
+        params_str = call_method_name[param_idx + 1 : -1]
         if params_str != "":
-            try:
-                params = ast.literal_eval("[" + params_str + "]")
-            except ValueError:
-                params = list(map(str.strip, params_str.split(",")))
+            params = _parse_arguments(params_str)
+            if params is None:
+                try:
+                    params = ast.literal_eval("[" + params_str + "]")
+                except (ValueError, SyntaxError):
+                    params = list(map(str.strip, params_str.split(",")))
+            params = tuple(params)
 
     return method_name, params
+
+
+def _parse_arguments(params_str):
+    """
+    Parse arguments that are strings, numbers, constants or bare words, which
+    are taken as strings. Returns `None` for anything else, such as lists.
+    """
+    params = []
+    pos = 0
+    while pos < len(params_str):
+        match = ARGUMENT_RE.match(params_str, pos)
+        if match is None:
+            return None
+        pos = match.end()
+
+        string, number, word = match.group("string", "number", "word")
+        if string is not None:
+            has_escapes = "\\" in string
+            params.append(ast.literal_eval(string) if has_escapes else string[1:-1])
+        elif number is not None:
+            is_int = number.lstrip("+-").isdigit()
+            params.append(int(number) if is_int else float(number))
+        else:
+            params.append(CONSTANTS.get(word, word))
+    return params
@@ -0,0 +1,211 @@
+import math
+import threading
+from collections import deque
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from time import perf_counter
+
+from flask import current_app
+from flask.signals import Namespace
+
+_signals = Namespace()
+
+# Sent with the phase timings of every message and render when metrics are on
+timings_recorded = _signals.signal("meld-timings-recorded")
+
+NULL_CONTEXT = nullcontext()
+QUANTILES = (0.5, 0.95, 0.99)
+
+# Action types that get their own label, any other type is labelled "invalid"
+ACTION_TYPES = frozenset(["callMethod", "syncInput"])
+
+_current_timer = ContextVar("meld_timer", default=None)
+
+
+def timed(phase):
+    """
+    Time a phase of the message or render being measured. Does nothing when
+    metrics are disabled.
+    """
+    timer = _current_timer.get()
+    if timer is None:
+        return NULL_CONTEXT
+    return timer.phase(phase)
+
+
+def message_timer(message):
+    """
+    Measure the processing of a meld-message, unless a measurement is already
+    running. The names in the message come from the client, so it is only
+    recorded once `component_resolved` was called for it.
+    """
+    metrics = getattr(current_app, "meld_metrics", None)
+    if metrics is None or _current_timer.get() is not None:
+        return NULL_CONTEXT
+    return metrics.timer(
+        "message",
+        message["componentName"],
+        action_type(message["actionQueue"]),
+        resolved=False,
+    )
+
+
+def component_resolved():
+    """
+    Mark the component of the message being measured as an existing component.
+    """
+    timer = _current_timer.get()
+    if timer is not None:
+        timer.resolved = True
+
+
+def render_timer(component_name):
+    """
+    Measure the initial render of a component by the `{% meld %}` tag.
+    """
+    metrics = getattr(current_app, "meld_metrics", None)
+    if metrics is None or _current_timer.get() is not None:
+        return NULL_CONTEXT
+    return metrics.timer("render", component_name, "")
+
+
+def action_type(action_queue):
+    types = sorted(
+        {
+            action["type"] if action["type"] in ACTION_TYPES else "invalid"
+            for action in action_queue
+        }
+    )
+    return "+".join(types) or "render"
+
+
+class Timer:
+    def __init__(self, resolved=True):
+        self.timings = {}
+        self.resolved = resolved
+
+    @contextmanager
+    def phase(self, name):
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = perf_counter() - start
+            self.timings[name] = self.timings.get(name, 0.0) + elapsed
+
+
+class Histogram:
+    """
+    Count and sum of every observation, with quantiles computed from the most
+    recent `size` observations.
+    """
+
+    def __init__(self, size=1024):
+        self.samples = deque(maxlen=size)
+        self.count = 0
+        self.sum = 0.0
+
+    def add(self, value):
+        self.samples.append(value)
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q):
+        samples = sorted(self.samples)
+        if not samples:
+            return 0.0
+        return samples[max(0, math.ceil(q * len(samples)) - 1)]
+
+    def summary(self):
+        summary = {"count": self.count, "sum": self.sum}
+        for q in QUANTILES:
+            summary[f"p{round(q * 100)}"] = self.quantile(q)
+        return summary
+
+
+class Metrics:
+    """
+    Aggregated phase timings of meld messages and renders, keyed by operation,
+    component name, action type and phase.
+    """
+
+    def __init__(self, samples=1024):
+        self.samples = samples
+        self.histograms = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def timer(self, operation, component_name, action, resolved=True):
+        timer = Timer(resolved)
+        token = _current_timer.set(timer)
+        start = perf_counter()
+        try:
+            yield timer
+        finally:
+            timer.timings["total"] = perf_counter() - start
+            _current_timer.reset(token)
+            if timer.resolved:
+                self.record(operation, component_name, action, timer.timings)
+
+    def record(self, operation, component_name, action, timings):
+        with self._lock:
+            for phase, elapsed in timings.items():
+                key = (operation, component_name, action, phase)
+                histogram = self.histograms.get(key)
+                if histogram is None:
+                    histogram = self.histograms[key] = Histogram(self.samples)
+                histogram.add(elapsed)
+
+        timings_recorded.send(
+            current_app._get_current_object(),
+            operation=operation,
+            component=component_name,
+            action=action,
+            timings=timings,
+        )
+
+    def to_dict(self):
+        with self._lock:
+            timings = [
+                dict(
+                    operation=operation,
+                    component=component_name,
+                    action=action,
+                    phase=phase,
+                    **histogram.summary(),
+                )
+                for (operation, component_name, action, phase), histogram in sorted(
+                    self.histograms.items()
+                )
+            ]
+        return {"timings": timings}
+
+    def to_prometheus(self, gauges=None):
+        lines = [
+            "# HELP meld_phase_seconds Time spent in each phase of meld messages "
+            "and renders.",
+            "# TYPE meld_phase_seconds summary",
+        ]
+        for timing in self.to_dict()["timings"]:
+            labels = ",".join(
+                f'{name}="{_escape_label(timing[name])}"'
+                for name in ("operation", "component", "action", "phase")
+            )
+            for q in QUANTILES:
+                value = timing[f"p{round(q * 100)}"]
+                lines.append(f'meld_phase_seconds{{{labels},quantile="{q}"}} {value}')
+            lines.append(f"meld_phase_seconds_sum{{{labels}}} {timing['sum']}")
+            lines.append(f"meld_phase_seconds_count{{{labels}}} {timing['count']}")
+
+        for name, value in (gauges or {}).items():
+            lines.append(f"# TYPE meld_{name} gauge")
+            lines.append(f"meld_{name} {value}")
+        return "\n".join(lines) + "\n"
+
+    def clear(self):
+        with self._lock:
+            self.histograms.clear()
+
+
+def _escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
@@ -0,0 +1,55 @@
+import threading
+
+from socketio import PubSubManager
+
+LOCAL_QUEUE_PREFIX = "local://"
+
+
+class LocalPubSubManager(PubSubManager):
+    """
+    Socket.IO message queue between servers in the same process. Use it to run
+    several Meld apps as if they were separate workers, without a Redis or
+    RabbitMQ server, for example in tests.
+    """
+
+    name = "local"
+
+    _subscribers = {}
+    _lock = threading.Lock()
+
+    queue = None
+
+    def initialize(self):
+        if self.queue is not None:
+            return
+        self.queue = self.server.eio.create_queue()
+        with self._lock:
+            self._subscribers.setdefault(self.channel, []).append(self.queue)
+        super().initialize()
+
+    def close(self):
+        with self._lock:
+            queues = self._subscribers.get(self.channel, [])
+            if self.queue in queues:
+                queues.remove(self.queue)
+
+    def _publish(self, data):
+        with self._lock:
+            queues = list(self._subscribers.get(self.channel, ()))
+        for queue in queues:
+            queue.put(data)
+
+    def _listen(self):
+        while True:
+            yield self.queue.get()
+
+
+def message_queue_options(url, channel):
+    """
+    Get the SocketIO options for the message queue at `url`. A `local://` url
+    uses a `LocalPubSubManager`; anything else is passed to Flask-SocketIO.
+    """
+    if url.startswith(LOCAL_QUEUE_PREFIX):
+        channel = url[len(LOCAL_QUEUE_PREFIX) :] or channel
+        return {"client_manager": LocalPubSubManager(channel=channel)}
+    return {"message_queue": url, "channel": channel}
@@ -0,0 +1,115 @@
+import os
+import threading
+from collections import namedtuple
+
+from .component import (
+    component_search_paths,
+    convert_to_camel_case,
+    convert_to_snake_case,
+    load_module_from_path,
+)
+
+RegistryEntry = namedtuple("RegistryEntry", ["component_class", "path", "mtime"])
+
+
+class ComponentRegistry:
+    """
+    Resolve component names to component classes once per application.
+
+    Component modules are executed the first time a component is requested and
+    the resulting class is reused for every later message and `{% meld %}` tag.
+    When `MELD_COMPONENT_RELOAD` is enabled (it defaults to `app.debug`) the
+    module file is checked for changes and re-executed when it was modified.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    @property
+    def auto_reload(self):
+        reload = self.app.config.get("MELD_COMPONENT_RELOAD", None)
+        if reload is None:
+            return self.app.debug
+        return reload
+
+    def get(self, component_name):
+        """
+        Get the component class for `component_name`, loading it if needed.
+        """
+        module_name = convert_to_snake_case(component_name)
+        entry = self._entries.get(module_name)
+
+        if entry is None or (self.auto_reload and self._is_stale(entry)):
+            with self._lock:
+                # Another thread may have loaded it while this one waited
+                entry = self._entries.get(module_name)
+                if entry is None or (self.auto_reload and self._is_stale(entry)):
+                    entry = self._load(module_name)
+        return entry.component_class
+
+    def preload(self):
+        """
+        Load every component found in the component search paths. Modules that
+        do not define a component class matching their file name are skipped.
+        """
+        loaded = []
+        for directory in component_search_paths(self.app):
+            if not os.path.isdir(directory):
+                continue
+            for filename in sorted(os.listdir(directory)):
+                module_name, ext = os.path.splitext(filename)
+                if ext != ".py" or module_name.startswith("_"):
+                    continue
+                with self._lock:
+                    if module_name in self._entries:
+                        continue
+                    entry = self._load(module_name, required=False)
+                if entry:
+                    loaded.append(module_name)
+        return loaded
+
+    def clear(self):
+        """
+        Forget every cached component class.
+        """
+        with self._lock:
+            self._entries.clear()
+
+    def __contains__(self, component_name):
+        return convert_to_snake_case(component_name) in self._entries
+
+    def _load(self, module_name, required=True):
+        full_path = self._find_module(module_name)
+        module = load_module_from_path(full_path, module_name)
+        class_name = convert_to_camel_case(module_name)
+
+        if required:
+            component_class = getattr(module, class_name)
+        else:
+            component_class = getattr(module, class_name, None)
+            if component_class is None:
+                return None
+
+        entry = RegistryEntry(component_class, full_path, self._mtime(full_path))
+        self._entries[module_name] = entry
+        return entry
+
+    def _find_module(self, module_name):
+        for directory in component_search_paths(self.app):
+            full_path = os.path.join(directory, module_name + ".py")
+            if os.path.isfile(full_path):
+                return full_path
+
+        raise FileNotFoundError(f"No meld component module named '{module_name}'")
+
+    def _is_stale(self, entry):
+        try:
+            return self._mtime(entry.path) != entry.mtime
+        except FileNotFoundError:
+            return True
+
+    @staticmethod
+    def _mtime(path):
+        return os.stat(path).st_mtime_ns
@@ -0,0 +1,112 @@
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar
+
+from flask import copy_current_request_context, g, has_request_context
+
+from .executor import GEVENT, INLINE, THREADS, gevent, pool_mode
+
+# Set while a component renders on the pool, where nested tags render in place
+_in_worker = ContextVar("meld_in_render_worker", default=False)
+
+
+class PageRenderer:
+    """
+    Render the `{% meld %}` tags of a page concurrently.
+
+    While the page template renders, each tag starts rendering its component
+    on a pool of `max_workers` threads or greenlets and leaves a placeholder in
+    the page. The placeholders are replaced with the rendered components when
+    the response is sent, so the page takes about as long as its slowest
+    component instead of the sum of all of them.
+
+    The `inline` mode renders the components in the tag itself.
+    """
+
+    def __init__(self, mode=THREADS, max_workers=8):
+        if mode == GEVENT and gevent is None:
+            raise RuntimeError("The 'gevent' meld renderer requires gevent")
+
+        self.mode = mode
+        self.max_workers = max_workers
+
+        self._pool = None
+        if mode == THREADS:
+            self._pool = ThreadPoolExecutor(
+                max_workers=max_workers, thread_name_prefix="meld-render"
+            )
+        elif mode == GEVENT:
+            self._pool = gevent.pool.Pool(max_workers)
+        elif mode != INLINE:
+            raise ValueError(f"Unknown meld renderer mode '{mode}'")
+
+    @classmethod
+    def for_socketio(cls, mode, socketio, **kwargs):
+        """
+        Create a renderer, picking the pool that matches the Socket.IO async
+        mode when `mode` is `auto`.
+        """
+        return cls(pool_mode(mode, socketio), **kwargs)
+
+    def render(self, node):
+        """
+        Start rendering the `MeldNode` and return the placeholder for it.
+        Nodes are rendered in place when there is no request to send them with.
+        """
+        if self._pool is None or _in_worker.get() or not has_request_context():
+            return node.render()
+
+        placeholder = f"<!--meld-render:{uuid.uuid4().hex}-->"
+
+        @copy_current_request_context
+        def render():
+            _in_worker.set(True)
+            return node.render()
+
+        if self.mode == GEVENT:
+            task = self._pool.spawn(render)
+        else:
+            task = self._pool.submit(render)
+
+        g.setdefault("meld_renders", {})[placeholder] = task
+        return placeholder
+
+    def resolve(self, html):
+        """
+        Wait for the components started by the current request and put them
+        in place of their placeholders in `html`.
+        """
+        renders = g.pop("meld_renders", None)
+        if not renders:
+            return html
+
+        for placeholder, task in renders.items():
+            rendered = task.get() if self.mode == GEVENT else task.result()
+            html = html.replace(placeholder, rendered, 1)
+        return html
+
+    def after_request(self, response):
+        if "meld_renders" not in g:
+            return response
+        if response.direct_passthrough or response.is_streamed:
+            # The body cannot be rewritten, but the renders are still awaited
+            self.resolve("")
+            return response
+
+        if response.mimetype != "text/html":
+            # The components would be spliced into JSON or other formats as
+            # raw HTML
+            self.resolve("")
+            raise RuntimeError(
+                "Components rendered for a non-HTML response must be put in "
+                "place with meld_renderer.resolve() before building it"
+            )
+
+        response.set_data(self.resolve(response.get_data(as_text=True)))
+        return response
+
+    def shutdown(self, wait=True):
+        if self.mode == THREADS:
+            self._pool.shutdown(wait=wait)
+        elif self.mode == GEVENT and wait:
+            self._pool.join()
@@ -0,0 +1,219 @@
+from html.parser import HTMLParser
+
+from bs4.builder import HTMLParserTreeBuilder
+from bs4.dammit import EntitySubstitution
+
+_builder = HTMLParserTreeBuilder()
+VOID_ELEMENTS = frozenset(_builder.empty_element_tags)
+PRESERVE_WHITESPACE_TAGS = frozenset(_builder.preserve_whitespace_tags)
+CDATA_LIST_ATTRIBUTES = {
+    tag: frozenset(attrs) for tag, attrs in _builder.cdata_list_attributes.items()
+}
+MODEL_ELEMENTS = frozenset(["input", "select", "textarea"])
+ASCII_SPACES = frozenset("\x20\x0a\x09\x0c\x0d")
+
+
+class RewriteUnsupported(Exception):
+    """
+    Raised when markup uses a construct that the rewriter does not reproduce
+    exactly. Callers fall back to the BeautifulSoup pipeline.
+    """
+
+
+class ComponentRewriter(HTMLParser):
+    """
+    Stream a rendered component template and apply the meld changes to it.
+
+    The root element gets the `meld:id` attribute and the `root_attributes`,
+    and `meld:model` inputs get their value, except for the ones in nested
+    components.
+    The output is identical to parsing the markup with BeautifulSoup's
+    `html.parser` builder, changing the tree and serializing it with
+    `UnsortedAttributes`, without building the tree.
+    """
+
+    def __init__(self, meld_id, context_variables, root_attributes=None):
+        super().__init__(convert_charrefs=False)
+        self.meld_id = meld_id
+        self.context_variables = context_variables
+        self.root_attributes = root_attributes or {}
+        self._out = []
+        self._data = []
+        self._stack = []
+        self._preserve = []
+        self._already_closed = []
+        self._root_found = False
+        self._in_root = False
+        self._nested_depth = None
+
+    def rewrite(self, markup):
+        self.feed(markup)
+        self.close()
+        self._end_data()
+        if self._stack:
+            self._pop(len(self._stack))
+
+        if not self._root_found:
+            raise RewriteUnsupported("No root element found")
+
+        return "".join(self._out)
+
+    def handle_starttag(self, tag, attrs, handle_empty_element=True):
+        self._end_data()
+        if tag == "meta":
+            # BeautifulSoup rewrites charset declarations on output
+            raise RewriteUnsupported(tag)
+
+        attributes = {}
+        for key, value in attrs:
+            attributes[key] = "" if value is None else value
+
+        list_attributes = CDATA_LIST_ATTRIBUTES.get("*", ())
+        tag_list_attributes = CDATA_LIST_ATTRIBUTES.get(tag, ())
+        for key in attributes:
+            if key in list_attributes or key in tag_list_attributes:
+                attributes[key] = " ".join(attributes[key].split())
+
+        is_void = tag in VOID_ELEMENTS
+        if not self._stack and not self._root_found:
+            if is_void:
+                raise RewriteUnsupported(tag)
+            self._root_found = True
+            self._in_root = True
+            attributes["meld:id"] = self.meld_id
+            attributes.update(self.root_attributes)
+        elif self._in_root and self._nested_depth is None:
+            if "meld:id" in attributes and not is_void:
+                self._nested_depth = len(self._stack) + 1
+            elif tag in MODEL_ELEMENTS:
+                self._set_value(attributes)
+
+        self._out.append(f"<{tag}{self._format_attributes(attributes)}")
+
+        if is_void:
+            self._out.append("/>")
+            if handle_empty_element:
+                self._already_closed.append(tag)
+            return
+
+        self._out.append(">")
+        self._stack.append(tag)
+        if tag in PRESERVE_WHITESPACE_TAGS:
+            self._preserve.append(len(self._stack))
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs, handle_empty_element=False)
+        if tag not in VOID_ELEMENTS:
+            self.handle_endtag(tag, check_already_closed=False)
+
+    def handle_endtag(self, tag, check_already_closed=True):
+        if check_already_closed and tag in self._already_closed:
+            self._already_closed.remove(tag)
+            return
+
+        self._end_data()
+        if tag in self._stack:
+            depth = len(self._stack) - self._stack[::-1].index(tag) - 1
+            self._pop(len(self._stack) - depth)
+
+    def handle_data(self, data):
+        self._data.append(data)
+
+    def handle_entityref(self, name):
+        character = EntitySubstitution.HTML_ENTITY_TO_CHARACTER.get(name)
+        self.handle_data(character if character is not None else f"&{name}")
+
+    def handle_charref(self, name):
+        try:
+            if name[:1] in ("x", "X"):
+                codepoint = int(name[1:], 16)
+            else:
+                codepoint = int(name)
+        except ValueError:
+            raise RewriteUnsupported(name)
+
+        if not (
+            0x20 <= codepoint < 0x7F
+            or 0xA0 <= codepoint < 0xD800
+            or 0xE000 <= codepoint < 0xFDD0
+        ):
+            raise RewriteUnsupported(name)
+        self.handle_data(chr(codepoint))
+
+    def handle_comment(self, data):
+        self._end_data()
+        self._out.append(f"<!--{self._collapse(data)}-->")
+
+    def handle_decl(self, decl):
+        raise RewriteUnsupported(decl)
+
+    def handle_pi(self, data):
+        raise RewriteUnsupported(data)
+
+    def unknown_decl(self, data):
+        raise RewriteUnsupported(data)
+
+    def _set_value(self, attributes):
+        model_attrs = [attr for attr in attributes if attr.startswith("meld:model")]
+        if len(model_attrs) > 1:
+            raise Exception("Multiple 'meld:model' attributes not allowed on one tag.")
+
+        for model_attr in model_attrs:
+            attributes["value"] = self.context_variables[attributes[model_attr]]
+
+    def _pop(self, count):
+        for _ in range(count):
+            depth = len(self._stack)
+            tag = self._stack.pop()
+            if self._preserve and self._preserve[-1] == depth:
+                self._preserve.pop()
+            if depth == 1 and self._in_root:
+                self._in_root = False
+            if depth == self._nested_depth:
+                self._nested_depth = None
+            self._out.append(f"</{tag}>")
+
+    def _end_data(self):
+        if self._data:
+            data = "".join(self._data)
+            self._data = []
+            self._out.append(self._collapse(data))
+
+    def _collapse(self, data):
+        if not self._preserve and all(char in ASCII_SPACES for char in data):
+            return "\n" if "\n" in data else " "
+        return data
+
+    @staticmethod
+    def _format_attributes(attributes):
+        formatted = ""
+        for key, value in attributes.items():
+            if value is None:
+                formatted += f" {key}"
+                continue
+            if isinstance(value, (list, tuple)):
+                try:
+                    value = " ".join(value)
+                except TypeError:
+                    raise RewriteUnsupported(key)
+            elif not isinstance(value, str):
+                value = str(value)
+
+            if '"' in value:
+                if "'" in value:
+                    value = value.replace('"', "&quot;")
+                    formatted += f' {key}="{value}"'
+                else:
+                    formatted += f" {key}='{value}'"
+            else:
+                formatted += f' {key}="{value}"'
+        return formatted
+
+
+def rewrite_component(markup, meld_id, context_variables, root_attributes=None):
+    """
+    Apply the meld changes to a rendered component template without building a
+    document tree.
+    """
+    rewriter = ComponentRewriter(meld_id, context_variables, root_attributes)
+    return rewriter.rewrite(markup)
@@ -0,0 +1,76 @@
+import time
+
+from .cache import RenderCache
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+
+class StateStore:
+    """
+    Keeps the state of rendered components on the server, so clients only send
+    their actions. Values are JSON strings keyed by component name and id.
+
+    Subclasses implement `get`, `set` and `delete`.
+    """
+
+    def get(self, key):
+        """
+        Get the state stored for `key`, or `None` when there is none.
+        """
+        raise NotImplementedError
+
+    def set(self, key, value):
+        raise NotImplementedError
+
+    def delete(self, key):
+        raise NotImplementedError
+
+
+class MemoryStateStore(RenderCache, StateStore):
+    """
+    In-process state store, bounded to `max_size` components with the least
+    recently used evicted first and an optional time to live in seconds.
+    """
+
+    def __init__(self, max_size=10000, ttl=None, clock=time.monotonic):
+        super().__init__(max_size=max_size, ttl=ttl, clock=clock)
+
+
+class RedisStateStore(StateStore):
+    """
+    State store for a Redis client, or anything with the same `get`, `set` and
+    `delete` methods. Use it to share component state between workers.
+    """
+
+    def __init__(self, client, prefix="meld:state:", ttl=None):
+        self.client = client
+        self.prefix = prefix
+        self.ttl = ttl
+
+    @classmethod
+    def from_url(cls, url, **kwargs):
+        """
+        Create a store for the Redis server at `url`. Requires redis-py.
+        """
+        if redis is None:
+            raise RuntimeError("A Redis state store requires the redis package")
+        return cls(redis.Redis.from_url(url), **kwargs)
+
+    def get(self, key):
+        value = self.client.get(self.prefix + key)
+        if isinstance(value, bytes):
+            value = value.decode("utf-8")
+        return value
+
+    def set(self, key, value):
+        self.client.set(self.prefix + key, value, ex=self.ttl)
+
+    def delete(self, key):
+        self.client.delete(self.prefix + key)
+
+
+def state_key(component_name, meld_id):
+    return f"{component_name}:{meld_id}"
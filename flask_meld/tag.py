@@ -1,13 +1,21 @@
 from jinja2 import nodes
 from jinja2.ext import Extension
-from flask import url_for
-from .component import get_component_class
+from flask import url_for, current_app
+from .component import current_render, get_component_class
+from .encoder import dumps
+from .metrics import render_timer, timed
+from .state import state_key
 
 
 class MeldTag(Extension):
     """
     Create a {% meld %} tag.
-    Used as {% meld 'component_name' %}
+    Used as {% meld 'component_name' %}, or {% meld 'component_name' lazy %}
+    to render the component once it is visible in the browser.
+
+    Keyword arguments are passed to the component as props, as in
+    {% meld 'todo' key=todo.id title=todo.title %}. Components nested in the
+    template of another component are re-rendered only when their props change.
     """
 
     tags = {"meld"}
@@ -16,12 +24,28 @@ class MeldTag(Extension):
         lineno = parser.stream.expect("name:meld").lineno
 
         component = parser.parse_expression()
-
-        call = self.call_method("_render", [component], lineno=lineno)
+        lazy = False
+        props = []
+        while parser.stream.current.type != "block_end":
+            if parser.stream.look().type == "assign":
+                key = parser.stream.expect("name").value
+                parser.stream.skip()
+                props.append(nodes.Pair(nodes.Const(key), parser.parse_expression()))
+            else:
+                parser.stream.expect("name:lazy")
+                lazy = True
+            parser.stream.skip_if("comma")
+
+        args = [component, nodes.Const(lazy), nodes.Dict(props)]
+        call = self.call_method("_render", args, lineno=lineno)
         return nodes.Output([nodes.MarkSafe(call)]).set_lineno(lineno)
 
-    def _render(self, component):
-        mn = MeldNode(component)
+    def _render(self, component, lazy=False, props=None):
+        mn = MeldNode(component, lazy=lazy, props=props)
+        renderer = getattr(current_app, "meld_renderer", None)
+        # Nested components render with the component that contains them
+        if renderer is not None and not lazy and current_render() is None:
+            return renderer.render(mn)
         return mn.render()
 
 
@@ -44,6 +68,16 @@ class MeldScriptsTag(Extension):
         msg_url = "message"
         base_js_url = "/meld_js_src"
         scripts = ""
+        socket_options = current_app.config.get("MELD_SOCKET_OPTIONS", None)
+        if socket_options:
+            options = dumps(socket_options)
+            scripts += f"<script>window.meldSocketOptions = {options};</script>"
+        bundle = getattr(current_app, "meld_bundle", None)
+        if bundle is not None:
+            scripts += f'<script src="{base_js_url}/{bundle.filename}"></script>'
+            scripts += f'<script>Meld.init("{msg_url}");</script>'
+            return scripts
+
         for f in files:
             url = f"{base_js_url}/{f}"
             scripts += f'<script src="{url}"></script>'
@@ -60,12 +94,37 @@ class MeldScriptsTag(Extension):
 
 
 class MeldNode:
-    def __init__(self, component):
+    def __init__(self, component, lazy=False, props=None):
         self.component_name = component
+        self.lazy = lazy
+        self.props = props or {}
 
     def render(self):
-        Component = get_component_class(self.component_name)
-        component = Component()
-        rendered_component = component.render(self.component_name)
+        render_context = current_render()
+        if render_context is not None:
+            return render_context.render_child(
+                self.component_name, self.props, lazy=self.lazy
+            )
+
+        with render_timer(self.component_name):
+            with timed("load"):
+                Component = get_component_class(self.component_name)
+            with Component._meld_lock():
+                with timed("construct"):
+                    props = dict(self.props)
+                    props.pop("key", None)
+                    component = Component(**props)
+                if self.lazy:
+                    rendered_component = component._placeholder(self.component_name)
+                else:
+                    rendered_component = component.render(
+                        self.component_name, init=True
+                    )
+
+            store = getattr(current_app, "meld_state_store", None)
+            if store is not None:
+                key = state_key(self.component_name, str(component.id))
+                with timed("store"):
+                    store.set(key, dumps(component._attributes()))
 
         return rendered_component
@@ -90,3 +90,160 @@ def write_init_contents(factory_init):
             "\treturn app",
         ]
         f.writelines(f"{line}\n" for line in class_def)
+
+
+COUNTER_COMPONENTS = {
+    "counter": [
+        "from flask_meld.component import Component",
+        "class Counter(Component):",
+        "\tcount = 0",
+        "\tdef add(self):",
+        "\t\tself.count = int(self.count) + 1",
+        "\tdef noop(self):",
+        "\t\tpass",
+        "\tdef add_amount(self, amount: int):",
+        "\t\tself.count = int(self.count) + amount",
+        "\tdef _reset(self):",
+        "\t\tself.count = 0",
+        "\tdef fail(self):",
+        "\t\traise ValueError('fail')",
+    ],
+    "shared_counter": [
+        "from flask_meld.component import Component",
+        "class SharedCounter(Component):",
+        "\tid = 'shared'",
+        "\tbroadcast = True",
+        "\tcount = 0",
+        "\tdef add(self):",
+        "\t\tself.count = int(self.count) + 1",
+    ],
+    "async_counter": [
+        "from flask_meld.component import Component",
+        "class AsyncCounter(Component):",
+        "\tcount = 0",
+        "\tupdates = 0",
+        "\tasync def add(self):",
+        "\t\tself.count = int(self.count) + 1",
+        "\tasync def updated(self, name):",
+        "\t\tself.updates = int(self.updates) + 1",
+    ],
+    "cached_counter": [
+        "from flask_meld.component import Component",
+        "class CachedCounter(Component):",
+        "\tcache_render = True",
+        "\tcache_size = 2",
+        "\tcount = 0",
+        "\tdef add(self):",
+        "\t\tself.count = int(self.count) + 1",
+    ],
+    "counter_list": [
+        "from flask_meld.component import Component",
+        "class CounterList(Component):",
+        "\tstart = 0",
+        "\tdef add(self):",
+        "\t\tself.start = int(self.start) + 1",
+    ],
+    "cached_list": [
+        "from flask_meld.component import Component",
+        "class CachedList(Component):",
+        "\tcache_render = True",
+        "\tstart = 0",
+    ],
+    "item": [
+        "from flask_meld.component import Component",
+        "class Item(Component):",
+        "\tlabel = ''",
+    ],
+    "item_list": [
+        "from flask_meld.component import Component",
+        "class ItemList(Component):",
+        "\tlabels = ['a', 'b']",
+        "\tdef noop(self):",
+        "\t\tpass",
+    ],
+    "row": [
+        "from flask_meld.component import Component",
+        "class Row(Component):",
+        "\tlabel = ''",
+    ],
+    "row_table": [
+        "from flask_meld.component import Component",
+        "class RowTable(Component):",
+        "\tlabels = ['a', 'b']",
+    ],
+    "email_form": [
+        "import time",
+        "from wtforms import Form, StringField",
+        "from flask_meld.component import Component",
+        "class Email(Form):",
+        "\temail = StringField('Email')",
+        "class EmailForm(Component):",
+        "\tform = Email()",
+        "\tseen = ''",
+        "\tdef check(self):",
+        "\t\ttime.sleep(0.05)",
+        "\t\tself.seen = self._form.email.data",
+    ],
+}
+
+COUNTER_TEMPLATE = (
+    '<div><button meld:click="add">+</button>'
+    '<input meld:model="count"><span>{{ count }}</span></div>'
+)
+
+COUNTER_LIST_TEMPLATE = (
+    '<div><button meld:click="add">+</button>'
+    "{% meld 'counter' key='a' count=start %}{% meld 'counter' count=5 %}</div>"
+)
+
+# Templates of the components that do not use COUNTER_TEMPLATE
+COMPONENT_TEMPLATES = {
+    "counter_list": COUNTER_LIST_TEMPLATE,
+    "cached_list": COUNTER_LIST_TEMPLATE,
+    "item": "<li><span>{{ label }}</span></li>",
+    "item_list": (
+        "<ul>{% for label in labels %}"
+        "{% meld 'item' key=label, label=label %}{% endfor %}</ul>"
+    ),
+    "email_form": "<div>{{ form.email }}<span>{{ seen }}</span></div>",
+    "row": "<tr><td>{{ label }}</td></tr>",
+    "row_table": (
+        "<table><tbody>{% for label in labels %}"
+        "{% meld 'row' key=label, label=label %}{% endfor %}</tbody></table>"
+    ),
+}
+
+
+@pytest.fixture
+def socket_app_factory(tmpdir):
+    # create project/meld/components and project/templates/meld with counters
+    Path(f"{tmpdir}/meld/components").mkdir(parents=True)
+    Path(f"{tmpdir}/templates/meld").mkdir(parents=True)
+    for name, lines in COUNTER_COMPONENTS.items():
+        with Path(f"{tmpdir}/meld/components/{name}.py").open("w") as f:
+            f.writelines(f"{line}\n" for line in lines)
+        template = COMPONENT_TEMPLATES.get(name, COUNTER_TEMPLATE)
+        Path(f"{tmpdir}/templates/meld/{name}.html").write_text(template)
+
+    def create_app(**config):
+        app = Flask(f"{tmpdir}", root_path=f"{tmpdir}")
+        app.secret_key = __name__
+        app.config.update(config)
+        Meld(app)
+        return app
+
+    return create_app
+
+
+@pytest.fixture
+def socket_app(socket_app_factory):
+    return socket_app_factory()
+
+
+def counter_message(id, action="add", component_name="counter", data=None):
+    return {
+        "id": id,
+        "componentName": component_name,
+        "actionQueue": [{"type": "callMethod", "payload": {"name": action}}],
+        "data": data if data is not None else {"count": 0},
+    }
@@ -0,0 +1,22 @@
+import json
+
+from benchmarks.__main__ import main
+
+
+def test_benchmarks_write_json(tmpdir):
+    output = tmpdir.join("results.json")
+    main(
+        [
+            "--sizes=1,5",
+            "--number=1",
+            "--sessions=2",
+            "--messages=3",
+            "--concurrency=2",
+            f"--output={output}",
+        ]
+    )
+
+    results = json.loads(output.read())
+    benchmarks = {(result["benchmark"], result["size"]) for result in results["micro"]}
+    assert ("view", 5) in benchmarks and ("bind_form", 1) in benchmarks
+    assert results["load"]["latency"]["count"] == 6
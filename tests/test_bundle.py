@@ -0,0 +1,89 @@
+import gzip
+import shutil
+import subprocess
+
+import pytest
+from flask import render_template_string
+
+from flask_meld.bundle import build_modules, minify
+from flask_meld.meld import Meld
+
+NODE = shutil.which("node")
+
+RUN_MODULES = """
+const vm = require("vm");
+const sent = [];
+const context = {
+  console,
+  setTimeout,
+  io: () => ({on() {}, emit(name, message) { sent.push(name); }}),
+  document: {addEventListener() {}},
+};
+context.window = context;
+vm.createContext(context);
+vm.runInContext(require("fs").readFileSync(0, "utf8"), context);
+console.log(typeof context.Meld.init, typeof context.Meld.componentInit);
+"""
+
+
+def test_minify_removes_comments_and_indentation():
+    source = """
+    /* block */
+    function f(a) {
+        // line comment
+        var s = "keep // this /* too */";
+        var t = `  and
+          this`;
+        return a.replace(/\\/\\/[a-z]+/g, "/") / 2;  // trailing
+    }
+    """
+    assert minify(source) == (
+        "function f(a) {\n"
+        'var s = "keep // this /* too */";\n'
+        "var t = `  and\n"
+        "          this`;\n"
+        'return a.replace(/\\/\\/[a-z]+/g, "/") / 2;\n'
+        "}\n"
+    )
+
+
+@pytest.mark.skipif(NODE is None, reason="node is not installed")
+def test_bundled_modules_define_meld():
+    result = subprocess.run(
+        [NODE, "-e", RUN_MODULES],
+        input=build_modules(Meld.static_directory),
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    assert result.stdout.strip() == "function function"
+
+
+def test_meld_scripts_use_the_bundle(socket_app):
+    with socket_app.test_request_context():
+        html = render_template_string("{% meld_scripts %}")
+    assert f'src="/meld_js_src/{socket_app.meld_bundle.filename}"' in html
+    assert "meld.js" not in html
+
+
+def test_bundle_is_served_with_long_lived_caching(socket_app):
+    bundle = socket_app.meld_bundle
+    client = socket_app.test_client()
+    url = f"/meld_js_src/{bundle.filename}"
+
+    response = client.get(url, headers={"Accept-Encoding": "gzip"})
+    assert response.headers["Cache-Control"] == "public, max-age=31536000, immutable"
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert gzip.decompress(response.data) == bundle.content
+    assert "Accept-Encoding" in response.headers["Vary"]
+
+    response = client.get(url, headers={"If-None-Match": response.headers["ETag"]})
+    assert response.status_code == 304
+
+
+def test_bundle_can_be_disabled(socket_app_factory):
+    app = socket_app_factory(MELD_BUNDLE=False)
+    with app.test_request_context():
+        html = render_template_string("{% meld_scripts %}")
+    assert app.meld_bundle is None
+    assert 'src="/meld_js_src/meld.js"' in html
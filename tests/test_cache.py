@@ -0,0 +1,77 @@
+from flask_meld.cache import RenderCache
+from flask_meld.component import get_component_class
+from flask_meld.message import process_message
+
+from conftest import counter_message
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+def test_cache_counts_hits_misses_and_evictions():
+    cache = RenderCache(max_size=2)
+    cache.set("a", "1")
+    cache.set("b", "2")
+    assert cache.get("a") == "1"
+    cache.set("c", "3")
+
+    assert cache.get("b") is None
+    assert cache.stats() == {"size": 2, "hits": 1, "misses": 1, "evictions": 1}
+
+
+def test_cache_entries_expire_after_ttl():
+    clock = FakeClock()
+    cache = RenderCache(ttl=10, clock=clock)
+    cache.set("a", "1")
+    clock.now = 9
+    assert cache.get("a") == "1"
+    clock.now = 10
+    assert cache.get("a") is None
+    assert cache.evictions == 1 and len(cache) == 0
+
+
+def test_cached_render_substitutes_component_id(socket_app):
+    with socket_app.test_request_context():
+        CachedCounter = get_component_class("cached_counter")
+        first = CachedCounter("first").render("cached_counter", init=True)
+        second = CachedCounter("second").render("cached_counter", init=True)
+        stats = CachedCounter._render_cache().stats()
+
+    assert 'meld:id="first"' in first and '"id":"first"' in first
+    assert second == first.replace("first", "second")
+    assert stats["hits"] == 1 and stats["misses"] == 1
+
+
+def test_cache_key_includes_init(socket_app):
+    with socket_app.test_request_context():
+        CachedCounter = get_component_class("cached_counter")
+        initial = CachedCounter("1").render("cached_counter", init=True)
+        rerender = CachedCounter("1").render("cached_counter")
+
+    assert "data-meld-init" in initial
+    assert "data-meld-init" not in rerender
+
+
+def test_cache_key_includes_attributes(socket_app):
+    with socket_app.test_request_context():
+        response = process_message(
+            counter_message("1", component_name="cached_counter")
+        )
+        process_message(counter_message("2", component_name="cached_counter"))
+        CachedCounter = get_component_class("cached_counter")
+        stats = CachedCounter._render_cache().stats()
+
+    assert "<span>1</span>" in response["dom"]
+    assert stats["hits"] == 1 and stats["misses"] == 1
+
+
+def test_components_are_not_cached_by_default(socket_app):
+    with socket_app.test_request_context():
+        Counter = get_component_class("counter")
+        Counter().render("counter")
+        assert "_meld_render_cache" not in Counter.__dict__
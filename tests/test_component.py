@@ -1,7 +1,9 @@
+import timeit
+
 from bs4 import BeautifulSoup
 from jinja2 import Template
 
-from flask_meld.component import Component
+from flask_meld.component import MEMBER_NAMES_CACHE_SIZE, Component
 
 
 class ExampleComponent(Component):
@@ -76,3 +78,87 @@ def test_render_model_defer_value(app):
     # Then
     soup = BeautifulSoup(rendered_html, features="html.parser")
     assert soup.find("input").attrs["value"] == "hello"
+
+
+class IntrospectedComponent(Component):
+    static = "value"
+    handler = staticmethod(lambda: None)
+
+    @property
+    def computed(self):
+        return "computed"
+
+    @property
+    def action(self):
+        return lambda: None
+
+    def method(self):
+        pass
+
+
+def test_component_members_are_cached_per_class():
+    IntrospectedComponent()._attributes()
+    ExampleComponent()._attributes()
+    members = IntrospectedComponent.__dict__["_meld_class_members"]
+    assert "test_var" not in members
+    assert members is IntrospectedComponent._meld_members()
+
+
+def test_component_descriptors_resolve_on_the_instance():
+    component = IntrospectedComponent()
+    assert list(component._attributes()) == ["computed", "errors", "static"]
+    assert list(component._functions()) == ["action", "handler", "method"]
+
+
+def test_component_instance_attributes_are_included():
+    component = IntrospectedComponent(extra=1, static=print)
+    assert component._attributes()["extra"] == 1
+    assert "static" in component._functions()
+    assert "static" not in component._attributes()
+    assert "extra" not in IntrospectedComponent()._attributes()
+
+
+class PropertyAttrsComponent(Component):
+    secret = "hidden"
+    shown = "shown"
+
+    @property
+    def _meld_attrs(self):
+        return ["id", "secret"]
+
+
+def test_meld_attrs_can_be_a_property():
+    component = PropertyAttrsComponent()
+    assert list(component._attributes()) == ["errors", "shown"]
+    assert "secret" not in PropertyAttrsComponent._meld_members()
+
+
+def test_member_names_cache_is_bounded():
+    for i in range(MEMBER_NAMES_CACHE_SIZE * 2):
+        component = IntrospectedComponent(**{f"key_{i}": i})
+        assert component._attributes()[f"key_{i}"] == i
+    cached = IntrospectedComponent.__dict__["_meld_member_names"]
+    assert len(cached) == MEMBER_NAMES_CACHE_SIZE
+
+
+def _dir_attributes(component):
+    return {
+        attr: getattr(component, attr)
+        for attr in dir(component)
+        if not callable(getattr(component, attr))
+        and not attr.startswith("_")
+        and attr not in component._meld_attrs
+    }
+
+
+def test_cached_attributes_are_faster_than_dir():
+    namespace = {f"attr_{i}": i for i in range(50)}
+    namespace.update({f"method_{i}": lambda self: None for i in range(50)})
+    LargeComponent = type("LargeComponent", (Component,), namespace)
+    component = LargeComponent(kwarg="value")
+
+    assert component._attributes() == _dir_attributes(component)
+
+    cached = timeit.timeit(component._attributes, number=200)
+    uncached = timeit.timeit(lambda: _dir_attributes(component), number=200)
+    assert cached < uncached
@@ -0,0 +1,184 @@
+import shutil
+import subprocess
+from pathlib import Path
+
+import orjson
+import pytest
+
+from flask_meld.diff import DomHistory, diff_trees, parse_tree
+from flask_meld.message import process_message
+
+from conftest import counter_message
+
+
+def apply_patch(root, ops):
+    """
+    Python version of patch.js, applied to a parsed tree.
+    """
+    for op in ops:
+        el = root
+        for index in op[1]:
+            el = el.elements()[index]
+        assert el.tag == op[2]
+
+        if op[0] == "attr":
+            el.attrs[op[3]] = op[4]
+        elif op[0] == "rmattr":
+            del el.attrs[op[3]]
+        elif op[0] == "text":
+            el.children = [op[3]]
+        elif op[0] == "html":
+            el.children = parse_tree(f"<x>{op[3]}</x>").children
+        elif op[0] == "replace":
+            parent = root
+            for index in op[1][:-1]:
+                parent = parent.elements()[index]
+            old = parent.elements()[op[1][-1]]
+            parent.children[parent.children.index(old)] = parse_tree(op[3])
+        elif op[0] == "order":
+            by_key = {child.key: child for child in el.elements()}
+            nodes = [
+                by_key[entry] if isinstance(entry, str) else parse_tree(entry["html"])
+                for entry in op[3]
+            ]
+            gaps = op[4]
+            if len(gaps) == 2:
+                gaps = [gaps[0]] * len(nodes) + [gaps[1]]
+            el.children = [
+                child for node, gap in zip(nodes, gaps) for child in (gap, node)
+            ] + [gaps[-1]]
+            el.children = [child for child in el.children if child != ""]
+
+
+def rows(items):
+    return "".join(f'\n<li meld:key="{item}">{item}</li>' for item in items)
+
+
+@pytest.mark.parametrize(
+    ["old", "new"],
+    [
+        ('<div><span>1</span></div>', '<div><span>2</span></div>'),
+        ('<div class="a"><input value="x"></div>', '<div class="b"><input></div>'),
+        ("<div><p>a</p></div>", "<div><p>a</p><p>b</p></div>"),
+        ("<div><p>a <b>b</b></p></div>", "<div><p>a <i>b</i> c</p></div>"),
+        (f"<div><ul>{rows('abc')}\n</ul></div>", f"<div><ul>{rows('cad')}\n</ul></div>"),
+        (f"<ul>{rows('ab')}</ul>", f"<ul>{rows('ba')}</ul>"),
+        ('<ul><li meld:key="a">1</li></ul>', '<ul><li meld:key="a">2</li></ul>'),
+        ("<div><table><tr><td>1</td></tr></table></div>", "<div><table><tr><td>&lt;2&gt;</td></tr></table></div>"),
+    ],
+)
+def test_patch_turns_old_tree_into_new_tree(old, new):
+    old_tree, new_tree = parse_tree(old), parse_tree(new)
+    ops = diff_trees(old_tree, new_tree)
+    apply_patch(old_tree, ops)
+    assert old_tree.outer_html() == new_tree.outer_html()
+
+
+def test_keyed_children_are_reordered_not_resent():
+    old = parse_tree(f"<ul>{rows(range(100))}</ul>")
+    new = parse_tree(f"<ul>{rows(reversed(range(100)))}</ul>")
+    (op,) = diff_trees(old, new)
+    assert op[0] == "order"
+    assert all(isinstance(entry, str) for entry in op[3])
+    assert op[4] == ["\n", ""]
+
+
+def test_changed_root_cannot_be_patched():
+    assert diff_trees(parse_tree("<div></div>"), parse_tree("<span></span>")) is None
+
+
+def test_history_sends_patch_when_client_has_a_base():
+    history = DomHistory()
+    table = "".join(f"<tr><td>{i}</td></tr>" for i in range(50))
+
+    first = history.patch_response(
+        "sid", {"base": None}, {"id": "1", "dom": f"<table><span>0</span>{table}</table>"}
+    )
+    assert first["version"] == 1 and "dom" in first
+
+    second = history.patch_response(
+        "sid", {"base": 1}, {"id": "1", "dom": f"<table><span>1</span>{table}</table>"}
+    )
+    assert "dom" not in second
+    assert second["base"] == 1 and second["version"] == 2
+    assert second["patch"] == [["text", [0], "span", "1"]]
+
+
+def test_history_sends_dom_without_base_and_forgets_sessions():
+    history = DomHistory(max_size=1)
+    history.patch_response("a", {}, {"id": "1", "dom": "<div>1</div>"})
+    response = history.patch_response("a", {}, {"id": "1", "dom": "<div>2</div>"})
+    assert response["dom"] == "<div>2</div>"
+
+    history.patch_response("b", {}, {"id": "1", "dom": "<div>1</div>"})
+    assert len(history) == 1
+    history.forget_session("b")
+    assert len(history) == 0
+
+
+def test_process_message_sends_patches_when_enabled(socket_app):
+    socket_app.meld_dom_history = DomHistory()
+    with socket_app.test_request_context():
+        first = process_message(counter_message("1"), sid="sid")
+        message = counter_message("1", data=first["data"])
+        message["base"] = first["version"]
+        second = process_message(message, sid="sid")
+
+    assert "dom" in first
+    assert ["text", [2], "span", "2"] in second["patch"]
+
+
+KEEP_PENDING = """
+class FakeElement {
+  constructor(tagName, children = []) {
+    this.tagName = tagName;
+    this.children = children;
+    this.attributes = {};
+    this.value = "";
+  }
+  setAttribute(name, value) { this.attributes[name] = value; }
+  removeAttribute(name) { delete this.attributes[name]; }
+  querySelectorAll() { return this.children.filter((el) => el.tagName === "INPUT"); }
+}
+const {applyPatch} = await import(process.argv[1]);
+const typing = new FakeElement("INPUT");
+const other = new FakeElement("INPUT");
+const root = new FakeElement("DIV", [typing, other]);
+typing.value = other.value = "typed";
+const keep = (el) => el === typing;
+const patched = applyPatch(root, [
+  ["attr", [0], "input", "value", "old"],
+  ["attr", [0], "input", "class", "error"],
+  ["attr", [1], "input", "value", "new"],
+], keep);
+const replaced = applyPatch(root, [["html", [], "div", "<input>"]], keep);
+console.log(JSON.stringify({patched, replaced, typing: typing.value,
+  typingClass: typing.attributes.class, other: other.value}));
+"""
+
+
+@pytest.mark.skipif(shutil.which("node") is None, reason="node is not installed")
+def test_client_patches_keep_pending_inputs(tmp_path):
+    patch = Path(__file__).parent.parent / "flask_meld" / "meld_js_src" / "patch.js"
+    module = tmp_path / "patch.mjs"
+    module.write_text(patch.read_text())
+
+    result = subprocess.run(
+        [
+            shutil.which("node"),
+            "--input-type=module",
+            "-e",
+            KEEP_PENDING,
+            module.as_uri(),
+        ],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    assert orjson.loads(result.stdout) == {
+        "patched": True,
+        "replaced": False,
+        "typing": "typed",
+        "typingClass": "error",
+        "other": "new",
+    }
@@ -0,0 +1,134 @@
+import base64
+import datetime
+import decimal
+import shutil
+import subprocess
+import uuid
+import zlib
+from pathlib import Path
+
+import orjson
+import pytest
+from wtforms import Form, StringField
+
+from flask_meld.encoder import MeldJSON, compress_dom, dumps
+from flask_meld.message import process_message
+
+from conftest import counter_message
+
+
+class NameForm(Form):
+    name = StringField("Name")
+
+
+def test_dumps_encodes_common_types():
+    value = {
+        "date": datetime.date(2021, 1, 2),
+        "price": decimal.Decimal("1.50"),
+        "id": uuid.UUID("12345678123456781234567812345678"),
+        "tags": {"a"},
+        1: "int key",
+    }
+    assert orjson.loads(dumps(value)) == {
+        "date": "2021-01-02",
+        "price": "1.50",
+        "id": "12345678-1234-5678-1234-567812345678",
+        "tags": ["a"],
+        "1": "int key",
+    }
+
+
+def test_dumps_encodes_wtforms_values():
+    form = NameForm(data={"name": "meld"})
+    assert orjson.loads(dumps({"form": form, "field": form.name})) == {
+        "form": {"name": "meld"},
+        "field": "meld",
+    }
+
+
+def test_app_default_is_used_first(app):
+    app.config["MELD_JSON_DEFAULT"] = lambda obj: "custom"
+    try:
+        with app.app_context():
+            assert dumps(decimal.Decimal("1")) == '"custom"'
+    finally:
+        app.config["MELD_JSON_DEFAULT"] = None
+
+
+def test_meld_json_is_a_socketio_json_module():
+    encoded = MeldJSON.dumps({"a": decimal.Decimal("2")}, separators=(",", ":"))
+    assert MeldJSON.loads(encoded) == {"a": "2"}
+
+
+def test_response_data_is_structured(socket_app):
+    with socket_app.test_request_context():
+        result = process_message(counter_message("1"))
+    assert result["data"] == {"count": 1, "errors": {}}
+
+
+def test_socket_response_data_is_an_object(socket_app):
+    client = socket_app.socketio.test_client(socket_app)
+    client.emit("meld-message", counter_message("1"))
+    response = client.get_received()[0]["args"][0]
+    assert response["data"]["count"] == 1
+
+
+def test_compress_dom_above_threshold():
+    dom = "<div>" + "<p>row</p>" * 100 + "</div>"
+    response = compress_dom({"accept": "deflate"}, {"id": "1", "dom": dom}, 100)
+    assert response["encoding"] == "deflate"
+    assert zlib.decompress(response["dom"]).decode("utf-8") == dom
+
+
+def test_compress_dom_needs_client_support_and_size():
+    dom = "<div></div>"
+    assert compress_dom({}, {"dom": dom}, 0) == {"dom": dom}
+    assert compress_dom({"accept": "deflate"}, {"dom": dom}, 100) == {"dom": dom}
+    assert compress_dom({"accept": "deflate"}, {"dom": dom}, None) == {"dom": dom}
+
+
+def test_large_renders_are_compressed(socket_app_factory):
+    app = socket_app_factory(MELD_COMPRESS_THRESHOLD=10)
+    message = dict(counter_message("1"), accept="deflate")
+    with app.test_request_context():
+        response = process_message(message)
+    assert "<span>1</span>" in zlib.decompress(response["dom"]).decode("utf-8")
+
+
+INFLATE = """
+globalThis.window = {};
+globalThis.io = () => ({on() {}, emit() {}});
+const {decodeResponse} = await import(process.argv[1]);
+const dom = Buffer.from(process.argv[2], "base64");
+const plain = {id: "2", dom: "<p></p>"};
+const response = await decodeResponse({batch: [{id: "1", dom, encoding: "deflate"}, plain]});
+console.log(JSON.stringify(response));
+"""
+
+
+@pytest.mark.skipif(shutil.which("node") is None, reason="node is not installed")
+def test_client_inflates_compressed_doms(tmp_path):
+    utils = Path(__file__).parent.parent / "flask_meld" / "meld_js_src" / "utils.js"
+    module = tmp_path / "utils.mjs"
+    module.write_text(utils.read_text())
+    dom = zlib.compress(b"<div>compressed</div>")
+
+    result = subprocess.run(
+        [
+            shutil.which("node"),
+            "--input-type=module",
+            "-e",
+            INFLATE,
+            module.as_uri(),
+            base64.b64encode(dom).decode(),
+        ],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    assert orjson.loads(result.stdout) == {
+        "batch": [
+            {"id": "1", "dom": "<div>compressed</div>"},
+            {"id": "2", "dom": "<p></p>"},
+        ]
+    }
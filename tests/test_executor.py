@@ -0,0 +1,165 @@
+import threading
+import time
+
+import pytest
+
+from flask_meld.executor import ActionExecutor, run_action
+from flask_meld.message import MessageJob, coalesce_actions, process_message
+
+from conftest import counter_message
+
+
+def test_jobs_for_one_component_run_in_order():
+    executor = ActionExecutor("threads", max_workers=4)
+    order = []
+
+    def job(i):
+        time.sleep(0.001 * (5 - i))
+        order.append(i)
+
+    for i in range(5):
+        executor.submit("component", lambda i=i: job(i))
+    executor.shutdown()
+    assert order == [0, 1, 2, 3, 4]
+
+
+def test_components_run_concurrently():
+    executor = ActionExecutor("threads", max_workers=2)
+    barrier = threading.Barrier(2, timeout=5)
+    finished = []
+
+    for key in ("a", "b"):
+        executor.submit(key, lambda key=key: finished.append(barrier.wait() >= 0))
+    executor.shutdown()
+    assert finished == [True, True]
+
+
+def test_queue_depth_counts_waiting_jobs():
+    executor = ActionExecutor("threads", max_workers=1)
+    release = threading.Event()
+    executor.submit("a", release.wait)
+    executor.submit("a", lambda: None)
+    executor.submit("a", lambda: None)
+
+    assert executor.queue_depth == 2
+    assert executor.stats()["active_components"] == 1
+    release.set()
+    executor.shutdown()
+    assert executor.queue_depth == 0 and executor.active_components == 0
+
+
+def test_failing_job_does_not_block_the_component():
+    executor = ActionExecutor()
+    ran = []
+    executor.submit("a", lambda: 1 / 0)
+    executor.submit("a", lambda: ran.append(True))
+    assert ran == [True]
+
+
+def test_unknown_mode_is_rejected():
+    with pytest.raises(ValueError):
+        ActionExecutor("processes")
+
+
+def test_run_action_awaits_coroutines():
+    async def add(a, b):
+        return a + b
+
+    assert run_action(add, 1, 2) == 3
+    assert run_action(lambda: 3) == 3
+
+
+def test_async_methods_and_hooks(socket_app):
+    message = counter_message("1", component_name="async_counter")
+    message["actionQueue"].insert(
+        0, {"type": "syncInput", "payload": {"name": "count", "value": "5"}}
+    )
+    with socket_app.test_request_context():
+        response = process_message(message)
+    assert response["data"]["count"] == 6
+    assert response["data"]["updates"] == 1
+
+
+def test_messages_are_processed_on_the_pool(socket_app):
+    socket_app.meld_executor = ActionExecutor("threads", max_workers=2)
+    client = socket_app.socketio.test_client(socket_app)
+    client.emit("meld-message", counter_message("1"))
+    socket_app.meld_executor.shutdown()
+
+    (received,) = client.get_received()
+    assert received["args"][0]["data"]["count"] == 1
+
+
+def sync_input(name, value):
+    return {"type": "syncInput", "payload": {"name": name, "value": value}}
+
+
+def call_method(name):
+    return {"type": "callMethod", "payload": {"name": name}}
+
+
+def test_coalesce_keeps_last_sync_input_before_each_method():
+    actions = [
+        sync_input("a", 1),
+        sync_input("b", 1),
+        sync_input("a", 2),
+        call_method("save"),
+        sync_input("a", 3),
+        sync_input("a", 4),
+    ]
+    assert coalesce_actions(actions) == [
+        sync_input("b", 1),
+        sync_input("a", 2),
+        call_method("save"),
+        sync_input("a", 4),
+    ]
+
+
+def test_waiting_messages_are_merged():
+    executor = ActionExecutor("threads", max_workers=1)
+    release = threading.Event()
+    executor.submit("a", release.wait)
+
+    processed = []
+    for value in ("h", "he", "hel"):
+        message = counter_message("a", data={"count": value})
+        message["actionQueue"] = [sync_input("count", value)]
+        executor.submit("a", MessageJob(message, "sid", processed.append))
+    release.set()
+    executor.shutdown()
+
+    (message,) = processed
+    assert message["actionQueue"] == [sync_input("count", "hel")]
+    assert executor.merged_jobs == 2 and executor.dropped_actions == 2
+
+
+def test_messages_from_other_clients_are_not_merged():
+    job = MessageJob(counter_message("a"), "one", None)
+    assert job.merge(MessageJob(counter_message("a"), "two", None)) is None
+
+
+def test_merged_message_answers_for_the_last_sequence_number():
+    first = MessageJob(dict(counter_message("a"), seq=1), "sid", None)
+    second = MessageJob(dict(counter_message("a"), seq=2), "sid", None)
+    merged, _ = first.merge(second)
+    assert merged.message["seq"] == 2
+
+
+def test_components_sharing_a_form_do_not_mix_their_data(socket_app):
+    executor = ActionExecutor("threads", max_workers=2)
+    responses = {}
+
+    def run(meld_id, email):
+        message = counter_message(
+            meld_id, "check", component_name="email_form", data={"email": email}
+        )
+        with socket_app.test_request_context():
+            responses[meld_id] = process_message(message)
+
+    executor.submit("a", lambda: run("a", "a@example.com"))
+    executor.submit("b", lambda: run("b", "b@example.com"))
+    executor.shutdown()
+
+    assert responses["a"]["data"]["seen"] == "a@example.com"
+    assert responses["b"]["data"]["seen"] == "b@example.com"
+    assert 'value="b@example.com"' in responses["b"]["dom"]
@@ -1,4 +1,5 @@
-from flask_meld.component import Component
+from flask import Flask
+from flask_meld.component import Component, _form_fields
 from flask_wtf import FlaskForm
 from wtforms import Form, StringField, PasswordField, SubmitField
 from wtforms.validators import ValidationError, DataRequired, Email, EqualTo
@@ -83,3 +84,44 @@ def test_form_validates():
 def test_form_submit_model_is_not_set():
     component = FormComponent()
     assert "meld:model" not in component._form.submit.__call__()
+
+
+def test_form_fields_are_computed_once_per_form_class():
+    component = FormComponent()
+    assert _form_fields(component._form) is _form_fields(RegistrationForm())
+    assert [name for name, _ in _form_fields(component._form)] == [
+        "email",
+        "password",
+        "password_confirm",
+    ]
+
+
+def test_rebind_form_sets_changed_fields():
+    component = FormComponent(email="old@test.com", password="somepass")
+    component.email = "new@test.com"
+    component._rebind_form()
+    assert component._form.email.data == "new@test.com"
+    assert component._form.password.data == "somepass"
+
+
+def test_field_validation_only_reports_the_field():
+    component = FormComponent(email="", password="", password_confirm="")
+    component.validate()
+    component.errors = {}
+    component.validate(component._form.email)
+    assert list(component.errors) == ["email"]
+
+
+def test_csrf_token_is_read_from_the_field():
+    class TokenForm(FlaskForm):
+        email = StringField("Email")
+
+    app = Flask(__name__)
+    app.secret_key = __name__
+    with app.test_request_context():
+
+        class TokenComponent(Component):
+            form = TokenForm()
+
+        component = TokenComponent(csrf_token="stale")
+        assert component.csrf_token == component._form.csrf_token.current_token
@@ -1,5 +1,15 @@
+import os
+import re
+import threading
+
 import pytest
+from flask import Flask, render_template_string, request
+from flask_meld import Meld
 from flask_meld.component import get_component_class
+from flask_meld.message import MessageJob, process_message
+from flask_socketio import SocketIO
+
+from conftest import counter_message, create_test_component, init_app
 
 
 def test_module_load_with_app_factory(app_factory_ctx):
@@ -27,3 +37,264 @@ def test_module_load_exception_without_user_specified_dir(app):
     with app.app_context():
         with pytest.raises(FileNotFoundError):
             get_component_class("non-existant-module")
+
+
+def test_component_class_is_cached(app_ctx):
+    assert get_component_class("search") is get_component_class("search")
+
+
+def test_registry_reloads_modified_component(tmpdir):
+    app_dir = create_test_component(tmpdir)
+    app = init_app(f"{app_dir}")
+    app.config["MELD_COMPONENT_RELOAD"] = True
+    with app.app_context():
+        first = get_component_class("search")
+        component_file = tmpdir.join("meld", "components", "search.py")
+        component_file.write("from flask_meld.component import Component\n"
+                             "class Search(Component):\n\tstate='changed'\n")
+        stat = os.stat(component_file)
+        os.utime(component_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+        second = get_component_class("search")
+        assert second is not first
+        assert second.state == "changed"
+
+
+def test_registry_does_not_reload_by_default(tmpdir):
+    app_dir = create_test_component(tmpdir)
+    app = init_app(f"{app_dir}")
+    with app.app_context():
+        first = get_component_class("search")
+        component_file = tmpdir.join("meld", "components", "search.py")
+        stat = os.stat(component_file)
+        os.utime(component_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+        assert get_component_class("search") is first
+
+
+def test_registry_loads_a_component_once_for_concurrent_requests(tmpdir):
+    app_dir = create_test_component(tmpdir)
+    tmpdir.join("meld", "components", "slow.py").write(
+        "import time\n"
+        "from flask_meld.component import Component\n"
+        "time.sleep(0.05)\n"
+        "class Slow(Component):\n\tpass\n"
+    )
+    app = init_app(f"{app_dir}")
+    classes = []
+
+    def load():
+        classes.append(app.meld_registry.get("slow"))
+
+    threads = [threading.Thread(target=load) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(classes) == 4 and len(set(classes)) == 1
+
+
+def test_registry_preload(tmpdir):
+    app_dir = create_test_component(tmpdir)
+    tmpdir.join("meld", "components", "helpers.py").write("VALUE = 1\n")
+    app = init_app(f"{app_dir}")
+    assert app.meld_registry.preload() == ["search"]
+    assert "search" in app.meld_registry
+    assert "helpers" not in app.meld_registry
+
+
+def test_response_is_sent_only_to_sender(socket_app):
+    sender = socket_app.socketio.test_client(socket_app)
+    other = socket_app.socketio.test_client(socket_app)
+
+    sender.emit("meld-message", counter_message("1"))
+
+    received = sender.get_received()
+    assert [r["name"] for r in received] == ["meld-response"]
+    assert received[0]["args"][0]["id"] == "1"
+    assert other.get_received() == []
+
+
+def test_broadcast_component_response_is_sent_to_subscribers(socket_app):
+    sender = socket_app.socketio.test_client(socket_app)
+    subscriber = socket_app.socketio.test_client(socket_app)
+    other = socket_app.socketio.test_client(socket_app)
+
+    subscriber.emit("meld-subscribe", {"id": "shared", "componentName": "shared_counter"})
+    sender.emit("meld-message", counter_message("shared", component_name="shared_counter"))
+
+    assert len(sender.get_received()) == 1
+    assert len(subscriber.get_received()) == 1
+    assert other.get_received() == []
+
+
+def test_broadcast_response_names_the_sender(socket_app):
+    sids = []
+
+    @socket_app.socketio.on("connect")
+    def connect(*args):
+        sids.append(request.sid)
+
+    sender = socket_app.socketio.test_client(socket_app)
+    subscriber = socket_app.socketio.test_client(socket_app)
+    subscriber.emit("meld-subscribe", {"id": "shared", "componentName": "shared_counter"})
+    message = counter_message("shared", component_name="shared_counter")
+    sender.emit("meld-message", dict(message, seq=4))
+
+    (received,) = subscriber.get_received()
+    response = received["args"][0]
+    assert response["origin"] == sids[0] != sids[1]
+    assert response["seq"] == 4
+
+
+def test_subscribe_is_ignored_for_components_without_broadcast(socket_app):
+    sender = socket_app.socketio.test_client(socket_app)
+    subscriber = socket_app.socketio.test_client(socket_app)
+
+    subscriber.emit("meld-subscribe", {"id": "1", "componentName": "counter"})
+    sender.emit("meld-message", counter_message("1"))
+
+    assert subscriber.get_received() == []
+
+
+def test_component_id_can_be_shared(socket_app):
+    with socket_app.app_context():
+        component = get_component_class("shared_counter")()
+    assert component.id == "shared"
+
+
+def test_batched_messages_get_one_response(socket_app):
+    client = socket_app.socketio.test_client(socket_app)
+    client.emit(
+        "meld-message",
+        {"batch": [counter_message("1"), counter_message("2", data={"count": 5})]},
+    )
+
+    (received,) = client.get_received()
+    results = received["args"][0]["batch"]
+    assert [result["id"] for result in results] == ["1", "2"]
+    assert [result["data"]["count"] for result in results] == [1, 6]
+
+
+def test_batch_completes_when_a_message_fails(socket_app):
+    client = socket_app.socketio.test_client(socket_app)
+    failing = dict(counter_message("2", action="fail"), seq=3)
+    client.emit("meld-message", {"batch": [counter_message("1"), failing]})
+
+    (received,) = client.get_received()
+    ok, error = received["args"][0]["batch"]
+    assert ok["data"]["count"] == 1
+    assert error == {"id": "2", "error": "Server error", "seq": 3}
+
+
+def test_batch_completes_with_an_unknown_component(socket_app):
+    client = socket_app.socketio.test_client(socket_app)
+    unknown = dict(counter_message("2", component_name="nope"), seq=5)
+    client.emit("meld-message", {"batch": [counter_message("1"), unknown]})
+
+    (received,) = client.get_received()
+    ok, error = received["args"][0]["batch"]
+    assert ok["data"]["count"] == 1
+    assert error == {"id": "2", "error": "Server error", "seq": 5}
+
+
+def test_batched_broadcast_messages_go_to_subscribers(socket_app):
+    sender = socket_app.socketio.test_client(socket_app)
+    subscriber = socket_app.socketio.test_client(socket_app)
+    subscriber.emit("meld-subscribe", {"id": "shared", "componentName": "shared_counter"})
+
+    shared = counter_message("shared", component_name="shared_counter")
+    sender.emit("meld-message", {"batch": [counter_message("1"), shared]})
+
+    received = sender.get_received()
+    assert len(received) == 2
+    assert len(subscriber.get_received()) == 1
+
+
+def test_broadcast_messages_from_different_clients_are_not_merged(socket_app):
+    class RecordingExecutor:
+        def __init__(self):
+            self.jobs = []
+
+        def submit(self, key, job):
+            self.jobs.append(job)
+
+    socket_app.meld_executor = RecordingExecutor()
+    message = counter_message("shared", component_name="shared_counter")
+    for client in [socket_app.socketio.test_client(socket_app) for _ in range(2)]:
+        client.emit("meld-message", message)
+        client.emit("meld-message", message)
+
+    first, same_client, other_client, _ = socket_app.meld_executor.jobs
+    assert first.merge(same_client) is not None
+    assert first.merge(other_client) is None
+
+
+def test_batched_messages_are_not_merged():
+    job = MessageJob(counter_message("a"), "sid", None, mergeable=False)
+    assert job.merge(MessageJob(counter_message("a"), "sid", None)) is None
+
+
+def test_lazy_component_renders_a_placeholder(socket_app):
+    with socket_app.test_request_context():
+        html = render_template_string("{% meld 'counter' lazy %}")
+
+    assert "meld:lazy" in html and '"lazy":true' in html
+    assert "<span>" not in html
+
+
+def test_lazy_component_is_rendered_on_request(socket_app):
+    with socket_app.test_request_context():
+        html = render_template_string("{% meld 'counter' lazy %}")
+        meld_id = re.search('meld:id="([^"]+)"', html).group(1)
+
+        message = counter_message(meld_id)
+        message["actionQueue"] = []
+        response = process_message(message)
+
+    assert response["id"] == meld_id
+    assert "<span>0</span>" in response["dom"]
+
+
+def test_initial_render_carries_init_data(socket_app):
+    with socket_app.test_request_context():
+        html = render_template_string("{% meld 'counter' %}")
+
+    assert "data-meld-init='" in html and '"name":"counter"' in html
+    assert "<script" not in html
+
+
+def test_rerender_leaves_init_data_out(socket_app):
+    with socket_app.test_request_context():
+        response = process_message(counter_message("1"))
+
+    assert "data-meld-init" not in response["dom"]
+    assert "<script" not in response["dom"]
+
+
+def test_disconnect_handler_only_with_dom_patches(socket_app):
+    assert "disconnect" not in socket_app.socketio.server.handlers.get("/", {})
+
+
+def test_disconnect_keeps_the_app_handler():
+    app = Flask(__name__)
+    app.secret_key = __name__
+    app.config["MELD_DOM_PATCHES"] = True
+    socketio = SocketIO(app)
+    sids = []
+
+    @socketio.on("connect")
+    def app_connect(*args):
+        sids.append(request.sid)
+
+    @socketio.on("disconnect")
+    def app_disconnect(*args):
+        sids.append(request.sid)
+
+    Meld(app, socketio=socketio)
+    client = socketio.test_client(app)
+    app.meld_dom_history.patch_response(sids[0], {}, {"id": "1", "dom": "<div/>"})
+    client.disconnect()
+
+    assert len(sids) == 2 and sids[0] == sids[1]
+    assert len(app.meld_dom_history) == 0
@@ -1,6 +1,8 @@
 import pytest
 
-from flask_meld.message import parse_call_method_name
+from flask_meld.message import parse_call_method_name, process_message
+
+from conftest import counter_message
 
 
 @pytest.mark.parametrize(
@@ -13,10 +15,98 @@ from flask_meld.message import parse_call_method_name
         ("call(1)", [1]),
         ("call(1, 2)", [1, 2]),
         ("call(1, 2, 'hello')", [1, 2, "hello"]),
-        # ("call(1, 2, hello)", [1, 2, "hello"]), # should this be supported?
+        ("call(1, 2, hello)", [1, 2, "hello"]),
     ],
 )
 def test_parse(message_name, expected_params):
     method_name, params = parse_call_method_name(message_name)
     assert method_name == "call"
     assert params == expected_params
+
+
+@pytest.mark.parametrize(
+    ["message_name", "expected_params"],
+    [
+        ("call([1, 2])", [[1, 2]]),
+        ("call(True, None)", [True, None]),
+        ("call(-1.5)", [-1.5]),
+        ("call('it\\'s')", ["it's"]),
+    ],
+)
+def test_parse_values(message_name, expected_params):
+    assert parse_call_method_name(message_name) == ("call", expected_params)
+
+
+def test_annotated_arguments_are_converted(socket_app):
+    with socket_app.test_request_context():
+        response = process_message(counter_message("1", action="add_amount('2')"))
+    assert response["data"]["count"] == 2
+
+
+@pytest.mark.parametrize(
+    "action",
+    ["_reset", "__init__", "missing", "render", "add_amount(two)"],
+)
+def test_invalid_method_is_rejected(socket_app, action):
+    with socket_app.test_request_context():
+        response = process_message(counter_message("1", action=action))
+    assert response["id"] == "1"
+    assert "error" in response and "dom" not in response
+
+
+@pytest.mark.parametrize("name", ["_form", "id", "add"])
+def test_sync_input_for_private_name_or_method_is_rejected(socket_app, name):
+    message = counter_message("1")
+    message["actionQueue"] = [
+        {"type": "syncInput", "payload": {"name": name, "value": "1"}}
+    ]
+    with socket_app.test_request_context():
+        response = process_message(message)
+    assert "error" in response
+
+
+def test_action_without_changes_skips_render(socket_app):
+    with socket_app.test_request_context():
+        response = process_message(counter_message("1", action="noop"))
+    assert response == {"id": "1", "unchanged": True}
+
+
+def test_sync_input_for_unknown_name_skips_render(socket_app):
+    message = counter_message("1")
+    message["actionQueue"] = [
+        {"type": "syncInput", "payload": {"name": "missing", "value": "1"}}
+    ]
+    with socket_app.test_request_context():
+        response = process_message(message)
+    assert response.get("unchanged")
+
+
+def test_action_with_changes_renders(socket_app):
+    with socket_app.test_request_context():
+        response = process_message(counter_message("1"))
+    assert response["data"]["count"] == 1
+    assert "<span>1</span>" in response["dom"]
+
+
+def test_empty_action_queue_renders(socket_app):
+    message = counter_message("1")
+    message["actionQueue"] = []
+    with socket_app.test_request_context():
+        response = process_message(message)
+    assert "dom" in response
+
+
+def test_response_echoes_sequence_number(socket_app):
+    message = counter_message("1")
+    message["seq"] = 7
+    with socket_app.test_request_context():
+        response = process_message(message)
+    assert response["seq"] == 7
+
+
+def test_unchanged_and_error_responses_echo_sequence_number(socket_app):
+    unchanged = dict(counter_message("1", action="noop"), seq=3)
+    invalid = dict(counter_message("1", action="_reset"), seq=4)
+    with socket_app.test_request_context():
+        assert process_message(unchanged) == {"id": "1", "unchanged": True, "seq": 3}
+        assert process_message(invalid)["seq"] == 4
@@ -0,0 +1,95 @@
+from flask import render_template_string
+
+from flask_meld.message import process_message
+from flask_meld.metrics import NULL_CONTEXT, Histogram, timed, timings_recorded
+
+from conftest import counter_message
+
+
+def test_metrics_are_disabled_by_default(socket_app):
+    assert socket_app.meld_metrics is None
+    with socket_app.test_request_context():
+        process_message(counter_message("1"))
+        assert timed("render_template") is NULL_CONTEXT
+
+
+def test_message_phases_are_recorded(socket_app_factory):
+    app = socket_app_factory(MELD_METRICS=True)
+    with app.test_request_context():
+        process_message(counter_message("1"))
+
+    phases = {
+        phase
+        for (operation, component, action, phase) in app.meld_metrics.histograms
+        if (operation, component, action) == ("message", "counter", "callMethod")
+    }
+    assert {"load", "construct", "actions", "render_template", "total"} <= phases
+
+
+def test_client_names_do_not_create_histograms(socket_app_factory):
+    app = socket_app_factory(MELD_METRICS=True)
+    with app.test_request_context():
+        for i in range(5):
+            message = counter_message("1")
+            message["actionQueue"] = [{"type": f"random{i}", "payload": {}}]
+            process_message(message)
+            try:
+                process_message(counter_message("1", component_name=f"random{i}"))
+            except FileNotFoundError:
+                pass
+
+    labels = {key[:3] for key in app.meld_metrics.histograms}
+    assert labels == {("message", "counter", "invalid")}
+
+
+def test_initial_render_is_recorded(socket_app_factory):
+    app = socket_app_factory(MELD_METRICS=True)
+    with app.test_request_context():
+        render_template_string("{% meld 'counter' %}")
+    assert ("render", "counter", "", "rewrite") in app.meld_metrics.histograms
+
+
+def test_timings_signal(socket_app_factory):
+    app = socket_app_factory(MELD_METRICS=True)
+    received = []
+
+    def receiver(sender, **kwargs):
+        received.append(kwargs)
+
+    with timings_recorded.connected_to(receiver, app):
+        client = app.socketio.test_client(app)
+        client.emit("meld-message", counter_message("1"))
+
+    (timings,) = received
+    assert timings["component"] == "counter"
+    assert "emit" in timings["timings"]
+
+
+def test_histogram_quantiles():
+    histogram = Histogram(size=100)
+    for value in range(1, 201):
+        histogram.add(value)
+
+    summary = histogram.summary()
+    assert summary["count"] == 200 and summary["sum"] == sum(range(1, 201))
+    assert (summary["p50"], summary["p95"], summary["p99"]) == (150, 195, 199)
+
+
+def test_metrics_endpoints(socket_app_factory):
+    app = socket_app_factory(MELD_METRICS=True)
+    with app.test_request_context():
+        process_message(counter_message("1"))
+
+    client = app.test_client()
+    timings = client.get("/meld/metrics").get_json()["timings"]
+    assert {"operation": "message", "phase": "total"}.items() <= timings[-1].items()
+
+    text = client.get("/meld/metrics/prometheus").get_data(as_text=True)
+    assert "# TYPE meld_phase_seconds summary" in text
+    assert 'phase="total",quantile="0.99"}' in text
+    assert "meld_executor_queue_depth 0" in text
+
+
+def test_metrics_url_can_be_disabled(socket_app_factory):
+    app = socket_app_factory(MELD_METRICS=True, MELD_METRICS_URL=None)
+    assert app.test_client().get("/meld/metrics").status_code == 404
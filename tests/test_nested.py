@@ -0,0 +1,169 @@
+import re
+from html import unescape
+
+import pytest
+
+from flask import render_template_string
+
+from flask_meld.component import CACHE_ID_PLACEHOLDER, get_component_class
+from flask_meld.diff import DomHistory
+from flask_meld.encoder import loads
+from flask_meld.message import process_message
+from flask_meld.state import MemoryStateStore, state_key
+
+from conftest import counter_message
+
+
+def render_list():
+    html = render_template_string("{% meld 'counter_list' %}")
+    meld_id = re.search('meld:id="([^"]+)"', html).group(1)
+    return meld_id, html
+
+
+def children(html):
+    return {
+        id: {"props": props, "tag": tag}
+        for tag, id, props in re.findall(
+            '<([a-z]+) meld:id="([^"]+)"[^>]* data-meld-props="([^"]+)"', html
+        )
+    }
+
+
+def list_message(meld_id, html, action="add", start=0, component_name="counter_list"):
+    message = counter_message(
+        meld_id, action, component_name=component_name, data={"start": start}
+    )
+    message["children"] = children(html)
+    return message
+
+
+def test_tag_passes_props_to_the_component(socket_app):
+    with socket_app.test_request_context():
+        html = render_template_string("{% meld 'counter' count=3, key='a' %}")
+
+    assert "<span>3</span>" in html
+    assert "data-meld-props" not in html
+
+
+def test_tag_accepts_props_after_lazy(socket_app):
+    with socket_app.test_request_context():
+        html = render_template_string("{% meld 'counter' lazy count=3 %}")
+
+    init = loads(unescape(re.search("data-meld-init='([^']+)'", html).group(1)))
+    assert init["lazy"] is True
+    assert init["data"]["count"] == 3
+
+
+def test_nested_components_get_ids_from_the_parent(socket_app):
+    with socket_app.test_request_context():
+        meld_id, html = render_list()
+
+    assert set(children(html)) == {f"{meld_id}.a", f"{meld_id}.1"}
+    assert "<span>0</span>" in html
+    assert "<span>5</span>" in html
+    assert html.count("data-meld-init") == 3
+
+
+def test_unchanged_children_are_sent_as_references(socket_app):
+    with socket_app.test_request_context():
+        meld_id, html = render_list()
+        message = list_message(meld_id, html)
+        message["actionQueue"] = []
+        response = process_message(message)
+
+    assert f'<div meld:ref="{meld_id}.a"></div>' in response["dom"]
+    assert f'<div meld:ref="{meld_id}.1"></div>' in response["dom"]
+    assert "<span>" not in response["dom"]
+
+
+def test_children_with_new_props_are_rendered_again(socket_app):
+    with socket_app.test_request_context():
+        meld_id, html = render_list()
+        response = process_message(list_message(meld_id, html))
+
+    dom = response["dom"]
+    assert f'meld:id="{meld_id}.a"' in dom
+    assert "<span>1</span>" in dom
+    new_props = children(dom)[f"{meld_id}.a"]["props"]
+    assert new_props != children(html)[f"{meld_id}.a"]["props"]
+    assert f'<div meld:ref="{meld_id}.1"></div>' in dom
+
+
+def test_children_keep_their_state(socket_app):
+    socket_app.meld_state_store = MemoryStateStore()
+    with socket_app.test_request_context():
+        meld_id, html = render_list()
+        child_id = f"{meld_id}.a"
+        stored = socket_app.meld_state_store.get(state_key("counter", child_id))
+        assert loads(stored)["count"] == 0
+
+        message = counter_message(child_id)
+        del message["data"]
+        response = process_message(message)
+
+    assert response["data"]["count"] == 1
+
+
+def test_nested_inputs_keep_their_own_values(socket_app):
+    with socket_app.test_request_context():
+        html = render_template_string("{% meld 'counter_list' start=2 %}")
+
+    assert html.count('<input meld:model="count" value="2"/>') == 1
+    assert html.count('<input meld:model="count" value="5"/>') == 1
+
+
+def test_parent_with_children_is_not_patched(socket_app):
+    socket_app.meld_dom_history = DomHistory()
+    with socket_app.test_request_context():
+        meld_id, html = render_list()
+        message = list_message(meld_id, html)
+        message["base"] = 1
+        first = process_message(message, sid="sid")
+        second = process_message(list_message(meld_id, html, start=1), sid="sid")
+
+    assert "dom" in first and "dom" in second
+    assert "version" not in second
+    assert len(socket_app.meld_dom_history) == 0
+
+
+def test_cached_components_with_children_are_not_cached(socket_app):
+    with socket_app.test_request_context():
+        first = render_template_string("{% meld 'cached_list' %}")
+        second = render_template_string("{% meld 'cached_list' %}")
+        CachedList = get_component_class("cached_list")
+
+    assert CachedList._meld_has_children
+    assert CACHE_ID_PLACEHOLDER not in first + second
+    first_id = re.search('meld:id="([^"]+)"', first).group(1)
+    second_id = re.search('meld:id="([^"]+)"', second).group(1)
+    assert set(children(first)) == {f"{first_id}.a", f"{first_id}.1"}
+    assert set(children(second)) == {f"{second_id}.a", f"{second_id}.1"}
+
+
+@pytest.mark.parametrize(
+    "component_name, tag", [("item_list", "li"), ("row_table", "tr")]
+)
+def test_references_keep_the_root_tag_of_the_child(socket_app, component_name, tag):
+    with socket_app.test_request_context():
+        html = render_template_string(f"{{% meld '{component_name}' %}}")
+        meld_id = re.search('meld:id="([^"]+)"', html).group(1)
+        message = list_message(meld_id, html, component_name=component_name)
+        message["actionQueue"] = []
+        response = process_message(message)
+
+    assert {child["tag"] for child in children(html).values()} == {tag}
+    assert f'<{tag} meld:ref="{meld_id}.a"></{tag}>' in response["dom"]
+    assert f'<{tag} meld:ref="{meld_id}.b"></{tag}>' in response["dom"]
+
+
+def test_references_need_a_valid_tag(socket_app):
+    with socket_app.test_request_context():
+        meld_id, html = render_list()
+        message = list_message(meld_id, html)
+        message["actionQueue"] = []
+        child = message["children"][f"{meld_id}.1"]
+        child["tag"] = 'div onclick="x"'
+        response = process_message(message)
+
+    assert "onclick" not in response["dom"]
+    assert f'meld:id="{meld_id}.1"' in response["dom"]
@@ -0,0 +1,90 @@
+import uuid
+
+import flask_socketio.test_client
+import pytest
+from flask import render_template_string
+
+from flask_meld.pubsub import LocalPubSubManager, message_queue_options
+from flask_meld.state import MemoryStateStore
+
+from conftest import counter_message
+
+
+def wait_for(client, app, attempts=100):
+    for _ in range(attempts):
+        received = client.get_received()
+        if received:
+            return received
+        app.socketio.sleep(0.01)
+    return []
+
+
+@pytest.fixture(autouse=True)
+def allow_test_client_with_queue(monkeypatch):
+    # The Socket.IO test client refuses message queues because it cannot see
+    # messages from other hosts; the local queue delivers them in this process.
+    monkeypatch.setattr(flask_socketio.test_client, "PubSubManager", type(None))
+
+
+def workers(socket_app_factory, count=2, **config):
+    queue = f"local://{uuid.uuid4().hex}"
+    return [
+        socket_app_factory(MELD_MESSAGE_QUEUE=queue, **config) for _ in range(count)
+    ]
+
+
+def test_message_queue_options():
+    assert message_queue_options("redis://localhost", "meld") == {
+        "message_queue": "redis://localhost",
+        "channel": "meld",
+    }
+    options = message_queue_options("local://tests", "meld")
+    assert isinstance(options["client_manager"], LocalPubSubManager)
+    assert options["client_manager"].channel == "tests"
+
+
+def test_broadcast_reaches_clients_on_other_workers(socket_app_factory):
+    first, second = workers(socket_app_factory)
+    subscriber = first.socketio.test_client(first)
+    sender = second.socketio.test_client(second)
+
+    subscriber.emit("meld-subscribe", {"id": "shared", "componentName": "shared_counter"})
+    sender.emit("meld-message", counter_message("shared", component_name="shared_counter"))
+
+    (received,) = wait_for(subscriber, first)
+    assert received["args"][0]["data"]["count"] == 1
+    assert len(wait_for(sender, second)) == 1
+
+
+def test_responses_reach_the_sender_only(socket_app_factory):
+    first, second = workers(socket_app_factory)
+    other = first.socketio.test_client(first)
+    sender = second.socketio.test_client(second)
+
+    sender.emit("meld-message", counter_message("1"))
+    assert len(wait_for(sender, second)) == 1
+    assert wait_for(other, first, attempts=5) == []
+
+
+def test_workers_share_component_state(socket_app_factory):
+    store = MemoryStateStore()
+    first, second = workers(socket_app_factory, MELD_STATE_STORE=store)
+
+    with first.test_request_context():
+        html = render_template_string("{% meld 'shared_counter' %}")
+    assert 'meld:id="shared"' in html
+
+    client = second.socketio.test_client(second)
+    message = counter_message("shared", component_name="shared_counter")
+    del message["data"]
+    client.emit("meld-message", message)
+
+    (received,) = wait_for(client, second)
+    assert received["args"][0]["data"]["count"] == 1
+
+
+def test_socket_options_are_passed_to_the_client(socket_app_factory):
+    app = socket_app_factory(MELD_SOCKET_OPTIONS={"transports": ["websocket"]})
+    with app.test_request_context():
+        html = render_template_string("{% meld_scripts %}")
+    assert 'window.meldSocketOptions = {"transports":["websocket"]};' in html
@@ -0,0 +1,86 @@
+import threading
+
+import pytest
+from flask import jsonify, render_template_string
+from flask_meld.executor import INLINE, THREADS
+from flask_meld.render import PageRenderer
+
+PAGE = "<main>{% meld 'counter' %}{% meld 'async_counter' %}</main>"
+
+
+@pytest.fixture
+def parallel_app(socket_app_factory):
+    app = socket_app_factory(MELD_PARALLEL_RENDER=THREADS, MELD_RENDER_WORKERS=2)
+
+    @app.route("/page")
+    def page():
+        return render_template_string(PAGE)
+
+    @app.route("/json")
+    def json():
+        return jsonify(html=render_template_string(PAGE))
+
+    @app.route("/resolved-json")
+    def resolved_json():
+        return jsonify(html=app.meld_renderer.resolve(render_template_string(PAGE)))
+
+    yield app
+    app.meld_renderer.shutdown()
+
+
+def test_parallel_render_is_disabled_by_default(socket_app):
+    assert socket_app.meld_renderer is None
+
+
+def test_page_components_are_stitched_into_the_response(parallel_app):
+    html = parallel_app.test_client().get("/page").get_data(as_text=True)
+
+    assert html.startswith("<main>") and html.endswith("</main>")
+    assert html.count("<span>0</span>") == 2
+    assert "meld-render" not in html
+
+
+def test_non_html_responses_are_not_rewritten(parallel_app):
+    parallel_app.testing = True
+    with pytest.raises(RuntimeError):
+        parallel_app.test_client().get("/json")
+
+    html = parallel_app.test_client().get("/resolved-json").get_json()["html"]
+    assert html.count("<span>0</span>") == 2
+
+
+def test_resolve_replaces_placeholders(parallel_app):
+    with parallel_app.test_request_context():
+        html = render_template_string(PAGE)
+        assert html.count("<!--meld-render:") == 2
+
+        html = parallel_app.meld_renderer.resolve(html)
+
+    assert html.count("<span>0</span>") == 2
+    assert "meld-render" not in html
+
+
+def test_components_render_on_the_pool(parallel_app):
+    class Node:
+        def render(self):
+            return threading.current_thread().name
+
+    with parallel_app.test_request_context():
+        placeholder = parallel_app.meld_renderer.render(Node())
+        name = parallel_app.meld_renderer.resolve(placeholder)
+
+    assert name.startswith("meld-render")
+
+
+def test_inline_renderer_renders_in_place(socket_app):
+    class Node:
+        def render(self):
+            return "rendered"
+
+    with socket_app.test_request_context():
+        assert PageRenderer(INLINE).render(Node()) == "rendered"
+
+
+def test_renderer_rejects_unknown_mode():
+    with pytest.raises(ValueError):
+        PageRenderer("processes")
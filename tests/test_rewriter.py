@@ -0,0 +1,77 @@
+import timeit
+
+import pytest
+
+from flask_meld.component import Component
+from flask_meld.rewriter import RewriteUnsupported, rewrite_component
+
+CONTEXT = {"text": "hello", "number": 12, "empty": None, "quoted": "say \"hi\" it's"}
+ROOT_ATTRIBUTES = {"data-meld-init": '{"id":"a&amp;b","name":"x"}'}
+
+
+@pytest.mark.parametrize(
+    "template",
+    [
+        '<div><input type="text" meld:model="text"></div>',
+        '<div>\n    <input meld:model.defer="text" value="old">\n</div>\n',
+        "<div><input meld:model='number'/><select meld:model='empty'></select></div>",
+        '<div><textarea meld:model="quoted">  keep  </textarea></div>',
+        '<div class="  a   b "><p title=\'say "hi"\'>x &amp; y &lt; z&nbsp;</p></div>',
+        "<div><pre>\n\n</pre>   \n   <span>  </span><!--   --></div>",
+        "<div><br><br/></br><img src=x></img><div/></div>",
+        "<div><p><b>unclosed</div><i>after root</i>",
+        "<div><script>if (a < b && c) {}</script><style> a > b {} </style></div>",
+        '<div id="1" id="2" disabled><a rel=" x  y " href="?a=1&amp;b=2">l</a></div>',
+        "<!-- leading --> <div meld:id='old'></div>",
+        "<div>&bogus; &#65; &#x263a;</div>",
+        '<div><div meld:id="x.a"><input meld:model="count" value="1"></div>'
+        '<input meld:model="text"></div>',
+    ],
+)
+def test_rewrite_matches_soup_output(template):
+    component = Component()
+    expected = component._soup_view(template, str(component.id), CONTEXT, ROOT_ATTRIBUTES)
+    assert rewrite_component(template, str(component.id), CONTEXT, ROOT_ATTRIBUTES) == expected
+
+
+@pytest.mark.parametrize(
+    "template",
+    [
+        "<input meld:model='text'>",
+        "text only",
+        "<!DOCTYPE html><div></div>",
+        "<div><meta charset='latin-1'></div>",
+        "<div>&#150;</div>",
+    ],
+)
+def test_rewrite_defers_unsupported_markup(template):
+    with pytest.raises(RewriteUnsupported):
+        rewrite_component(template, "id", CONTEXT, ROOT_ATTRIBUTES)
+
+
+def test_rewrite_rejects_multiple_models():
+    with pytest.raises(Exception, match="Multiple 'meld:model'"):
+        rewrite_component(
+            '<div><input meld:model="text" meld:model.defer="text"></div>',
+            "id",
+            CONTEXT,
+            ROOT_ATTRIBUTES,
+        )
+
+
+def test_rewrite_is_faster_than_soup():
+    rows = "".join(
+        f'<tr class="row"><td>{i}</td><td><input meld:model="text"></td>'
+        f'<td><button meld:click="remove({i})">x</button></td></tr>\n'
+        for i in range(200)
+    )
+    template = f'<div class="container"><table>{rows}</table></div>'
+    component = Component()
+
+    soup = timeit.timeit(
+        lambda: component._soup_view(template, "id", CONTEXT, ROOT_ATTRIBUTES), number=5
+    )
+    rewrite = timeit.timeit(
+        lambda: rewrite_component(template, "id", CONTEXT, ROOT_ATTRIBUTES), number=5
+    )
+    assert rewrite < soup
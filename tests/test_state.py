@@ -0,0 +1,154 @@
+import re
+from html import unescape
+
+from flask import render_template_string
+
+from flask_meld.encoder import dumps, loads
+from flask_meld.message import process_message
+from flask_meld.state import MemoryStateStore, RedisStateStore, state_key
+
+from conftest import counter_message
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeRedis:
+    def __init__(self):
+        self.values = {}
+        self.expiry = {}
+
+    def get(self, name):
+        return self.values.get(name)
+
+    def set(self, name, value, ex=None):
+        self.values[name] = value.encode("utf-8")
+        self.expiry[name] = ex
+
+    def delete(self, name):
+        self.values.pop(name, None)
+
+
+def state_message(id, state):
+    message = counter_message(id)
+    del message["data"]
+    message["state"] = state
+    return message
+
+
+def render_counter():
+    html = render_template_string("{% meld 'counter' %}")
+    meld_id = re.search('meld:id="([^"]+)"', html).group(1)
+    init = loads(unescape(re.search("data-meld-init='([^']+)'", html).group(1)))
+    return meld_id, init
+
+
+def test_memory_store_evicts_least_recently_used():
+    store = MemoryStateStore(max_size=2)
+    store.set("a", "1")
+    store.set("b", "2")
+    store.get("a")
+    store.set("c", "3")
+    assert store.get("b") is None
+    assert store.get("a") == "1" and len(store) == 2
+
+
+def test_memory_store_entries_expire():
+    clock = FakeClock()
+    store = MemoryStateStore(ttl=5, clock=clock)
+    store.set("a", "1")
+    clock.now = 5
+    assert store.get("a") is None
+
+
+def test_redis_store_uses_prefix_and_ttl():
+    client = FakeRedis()
+    store = RedisStateStore(client, ttl=60)
+    store.set("counter:1", '{"count":1}')
+    assert store.get("counter:1") == '{"count":1}'
+    assert client.expiry["meld:state:counter:1"] == 60
+    store.delete("counter:1")
+    assert store.get("counter:1") is None
+
+
+def test_initial_render_stores_state(socket_app):
+    socket_app.meld_state_store = MemoryStateStore()
+    with socket_app.test_request_context():
+        meld_id, init = render_counter()
+
+    stored = socket_app.meld_state_store.get(state_key("counter", meld_id))
+    assert loads(stored)["count"] == 0
+    assert "state" in init
+
+
+def test_message_without_data_uses_stored_state(socket_app):
+    socket_app.meld_state_store = MemoryStateStore()
+    with socket_app.test_request_context():
+        meld_id, init = render_counter()
+        first = process_message(state_message(meld_id, init["state"]))
+        second = process_message(state_message(meld_id, first["state"]))
+
+    assert first["data"] == {"count": 1}
+    assert second["data"] == {"count": 2}
+    assert "<span>2</span>" in second["dom"]
+
+
+def test_render_request_with_current_state(socket_app):
+    socket_app.meld_state_store = MemoryStateStore()
+    with socket_app.test_request_context():
+        meld_id, init = render_counter()
+        message = state_message(meld_id, init["state"])
+        message["actionQueue"] = []
+        response = process_message(message)
+
+    assert response["data"] == {}
+    assert response["state"] == init["state"]
+    assert "<span>0</span>" in response["dom"]
+
+
+def test_stale_client_gets_full_data(socket_app):
+    socket_app.meld_state_store = MemoryStateStore()
+    with socket_app.test_request_context():
+        meld_id, init = render_counter()
+        process_message(state_message(meld_id, init["state"]))
+        response = process_message(state_message(meld_id, init["state"]))
+
+    assert response["data"] == {"count": 2, "errors": {}}
+
+
+def test_missing_state_asks_client_to_resync(socket_app):
+    store = socket_app.meld_state_store = MemoryStateStore()
+    with socket_app.test_request_context():
+        response = process_message(state_message("1", "state"))
+        assert response == {"id": "1", "resync": True}
+
+        process_message(counter_message("1", data={"count": 5}))
+    assert loads(store.get(state_key("counter", "1")))["count"] == 6
+
+
+def test_stored_state_is_used_instead_of_client_data(socket_app):
+    store = socket_app.meld_state_store = MemoryStateStore()
+    store.set(state_key("counter", "1"), dumps({"count": 10}))
+    with socket_app.test_request_context():
+        response = process_message(state_message("1", None))
+    assert response["data"]["count"] == 11
+
+
+def test_client_data_does_not_override_stored_state(socket_app):
+    store = socket_app.meld_state_store = MemoryStateStore()
+    store.set(state_key("counter", "1"), dumps({"count": 10}))
+    with socket_app.test_request_context():
+        response = process_message(counter_message("1", data={"count": 99}))
+    assert response["data"]["count"] == 11
+
+
+def test_memory_store_deletes_entries():
+    store = MemoryStateStore()
+    store.set("a", "1")
+    store.delete("a")
+    assert store.get("a") is None and len(store) == 0